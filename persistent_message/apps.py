@@ -0,0 +1,12 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.apps import AppConfig
+
+
+class PersistentMessageConfig(AppConfig):
+    name = 'persistent_message'
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        import persistent_message.signals  # noqa: F401
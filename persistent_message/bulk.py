@@ -0,0 +1,117 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from persistent_message.models import Message
+from persistent_message.serializers import (
+    deserialize_message, serialize_messages, dumps, MESSAGE_VALUES)
+from persistent_message.signals import message_changed
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+import json
+
+
+def parse_messages(data):
+    """
+    Parses a JSON array of message objects, a JSON object with a messages
+    array, or newline-delimited JSON message objects.
+    """
+    try:
+        items = json.loads(data)
+    except ValueError:
+        try:
+            items = [json.loads(line) for line in data.splitlines() if (
+                line.strip())]
+        except ValueError as ex:
+            raise ValidationError('Invalid JSON: {}'.format(ex))
+
+    if isinstance(items, dict):
+        items = items['messages'] if 'messages' in items else [items]
+
+    if not isinstance(items, list):
+        raise ValidationError('Invalid JSON: expected a list of messages')
+
+    return items
+
+
+def import_messages(items, modified_by=''):
+    """
+    Validates and creates messages from a list of JSON message objects.
+    Returns a (messages, errors) tuple, where errors is a list of
+    {'index': ..., 'error': ...} objects. Nothing is created unless every
+    message is valid.
+    """
+    messages = []
+    message_tags = []
+    errors = []
+    for index, item in enumerate(items):
+        message = Message(modified_by=modified_by)
+        try:
+            tags = deserialize_message(message, item)
+            message.full_clean(exclude=['begins', 'modified_by'])
+        except (ValidationError, TypeError, AttributeError) as ex:
+            errors.append({'index': index, 'error': _error_message(ex)})
+            continue
+
+        messages.append(message)
+        message_tags.append(tags or [])
+
+    if len(errors):
+        return [], errors
+
+    db = router.db_for_write(Message)
+    with transaction.atomic(using=db):
+        if connections[db].features.can_return_rows_from_bulk_insert:
+            Message.objects.using(db).bulk_create(messages)
+        else:
+            for message in messages:
+                message.save(using=db)
+
+        Through = Message.tags.through
+        Through.objects.using(db).bulk_create([
+            Through(message_id=message.pk, tag_id=tag_id)
+            for message, tags in zip(messages, message_tags)
+            for tag_id in tags], ignore_conflicts=True)
+
+        message_changed()
+
+    return messages, errors
+
+
+def export_messages(chunk_size=500):
+    """
+    Generator of message JSON objects for every message, in id order. The
+    table is read in chunks, with tags fetched per chunk.
+    """
+    now = Message.current_datetime()
+    rows = Message.objects.order_by('pk').values(*MESSAGE_VALUES).iterator(
+        chunk_size=chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield from serialize_messages(chunk, now)
+            chunk = []
+    yield from serialize_messages(chunk, now)
+
+
+def iter_ndjson(objects):
+    for obj in objects:
+        yield dumps(obj) + b'\n'
+
+
+def iter_json_array(objects):
+    separator = b'['
+    for obj in objects:
+        yield separator + dumps(obj)
+        separator = b','
+    yield b']' if separator == b',' else b'[]'
+
+
+def _error_message(ex):
+    if isinstance(ex, ValidationError):
+        if hasattr(ex, 'error_dict'):
+            return '; '.join('{}: {}'.format(field, ' '.join(e)) for (
+                field, e) in ex.message_dict.items())
+        return ' '.join(ex.messages)
+    return 'Invalid message: {}'.format(ex)
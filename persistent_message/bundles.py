@@ -0,0 +1,187 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.conf import settings
+from django.utils import timezone, translation
+from persistent_message.cache import (
+    active_message_cache, get_cache, get_version, has_pending)
+from persistent_message.models import Message
+import hashlib
+import json
+import time
+
+AUDIENCE_KEY = 'persistent_message.audience.{}'
+AUDIENCE_PROBES = 4
+DIRTY_KEY = 'persistent_message.bundles_dirty'
+
+# The last time each audience was recorded by this process
+_recorded = {}
+
+
+def get_bundle_timeout():
+    return getattr(settings, 'PERSISTENT_MESSAGE_BUNDLE_TIMEOUT', 86400)
+
+
+def get_max_audiences():
+    return getattr(settings, 'PERSISTENT_MESSAGE_BUNDLE_MAX_AUDIENCES', 1000)
+
+
+def audience(tags, level=None):
+    """
+    Returns the canonical (level, tags, language, time zone) form of an
+    audience, for the active language and time zone.
+    """
+    return (level, tuple(sorted(set(tags))), translation.get_language(),
+            timezone.get_current_timezone_name())
+
+
+def audience_digest(audience):
+    return hashlib.sha1(json.dumps(audience).encode('utf-8')).hexdigest()
+
+
+def bundle_key(version, audience):
+    return 'persistent_message.bundle.{}.{}'.format(
+        version, audience_digest(audience))
+
+
+def build_bundle(active_set, audience, next_set=None):
+    """
+    Returns the bundle of an audience for an active set: the ordered active
+    messages with their static, context-free rendered HTML, valid until
+    the active set's expires boundary, rendered in the audience's language
+    and time zone. If next_set is given, the bundle for the following
+    active set is kept in its next slot.
+    """
+    level, tags, language, tz = audience
+    with translation.override(language), timezone.override(tz):
+        return {
+            'valid_until': active_set.expires,
+            'next': build_bundle(next_set, audience) if (
+                next_set is not None) else None,
+            'messages': [{
+                'id': message.pk,
+                'level': message.level,
+                'level_name': message.get_level_display(),
+                'tags': sorted(message.tag_names),
+                'html': str(message.render()),
+            } for message in active_set.filter(level=level, tags=tags)],
+        }
+
+
+def get_bundle(tags, level=None, now=None):
+    """
+    Returns the bundle of active messages for the tags and level. A bundle
+    for a known audience is read with a single cache get, and a bundle
+    that is missing or past its boundary is built from the process-local
+    active set. The audience is recorded for rebuild_bundles on a miss,
+    and again on hits, at most once per tenth of the bundle timeout.
+    """
+    if now is None:
+        now = Message.current_datetime()
+
+    key_audience = audience(tags, level)
+    cache = get_cache()
+    key = bundle_key(get_version(), key_audience)
+    bundle = cache.get(key)
+    if bundle is not None:
+        # A bundle prepared ahead of its boundary carries the next segment
+        for bundle in (bundle, bundle['next']):
+            if bundle is not None and (bundle['valid_until'] is None or (
+                    now < bundle['valid_until'])):
+                recorded = _recorded.get(key_audience)
+                if recorded is None or time.monotonic() - recorded > (
+                        get_bundle_timeout() / 10):
+                    add_audience(key_audience)
+                return bundle
+
+    active_set = active_message_cache.active_set(now)
+    bundle = build_bundle(active_set, key_audience)
+
+    # Uncommitted message changes are served, but not cached
+    if not has_pending('messages'):
+        cache.set(bundle_key(active_set.version, key_audience), bundle,
+                  timeout=get_bundle_timeout())
+        add_audience(key_audience)
+    return bundle
+
+
+def get_audiences():
+    """
+    Returns the audiences recorded within the bundle timeout, most recent
+    first.
+    """
+    slots = get_cache().get_many([
+        AUDIENCE_KEY.format(i) for i in range(get_max_audiences())])
+    seen = {}
+    for key_audience, recorded in slots.values():
+        seen[key_audience] = max(recorded, seen.get(key_audience, 0))
+    return sorted(seen, key=seen.get, reverse=True)
+
+
+def add_audience(key_audience):
+    """
+    Records an audience in one of a few cache slots chosen by its digest,
+    each cached for the bundle timeout: the slot already holding it, an
+    empty slot, or the slot of the least recently recorded audience. Only
+    the chosen slot is written, so concurrent misses for other audiences
+    are not overwritten.
+    """
+    cache = get_cache()
+    size = get_max_audiences()
+    start = int(audience_digest(key_audience), 16) % size
+    keys = [AUDIENCE_KEY.format((start + i) % size) for i in range(
+        min(AUDIENCE_PROBES, size))]
+    slots = cache.get_many(keys)
+
+    key = next((k for k in keys if k in slots and (
+        slots[k][0] == key_audience)), None) or next((
+            k for k in keys if k not in slots), None) or min(
+                keys, key=lambda k: slots[k][1])
+    cache.set(key, (key_audience, time.time()),
+              timeout=get_bundle_timeout())
+
+    if len(_recorded) >= size:
+        _recorded.clear()
+    _recorded[key_audience] = time.monotonic()
+
+
+def mark_bundles_dirty():
+    """
+    Marks the bundles as needing a rebuild by the message scheduler.
+    """
+    get_cache().set(DIRTY_KEY, True, timeout=None)
+
+
+def pop_bundles_dirty():
+    """
+    Returns True if the bundles were marked as needing a rebuild, clearing
+    the mark.
+    """
+    cache = get_cache()
+    if cache.get(DIRTY_KEY):
+        cache.delete(DIRTY_KEY)
+        return True
+    return False
+
+
+def rebuild_bundles(now=None, prepare_next=False):
+    """
+    Builds the bundles of the recently seen audiences for the current
+    active set, returning the number of bundles built. With prepare_next,
+    each bundle also carries the bundle for the active set that follows
+    the next boundary.
+    """
+    audiences = get_audiences()
+    if not len(audiences):
+        return 0
+
+    active_set = active_message_cache.active_set(now)
+    next_set = active_message_cache.active_set(active_set.expires) if (
+        prepare_next and active_set.expires is not None) else None
+    if next_set is not None and next_set.version != active_set.version:
+        next_set = None
+
+    get_cache().set_many({bundle_key(active_set.version, a): build_bundle(
+        active_set, a, next_set) for a in audiences},
+        timeout=get_bundle_timeout())
+    return len(audiences)
@@ -0,0 +1,317 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from persistent_message.notify import get_transport
+from persistent_message.metrics import cache_result
+from asgiref.sync import sync_to_async
+from bisect import bisect_right
+from collections import defaultdict, OrderedDict
+from threading import Lock, local
+from uuid import uuid4
+
+TAG_VERSION_KEY = 'persistent_message.tag_version'
+
+_pending = local()
+
+
+def get_cache():
+    return caches[getattr(
+        settings, 'PERSISTENT_MESSAGE_CACHE_ALIAS', 'default')]
+
+
+def get_version():
+    """
+    Returns the current message version stamp, as seen by this process.
+    """
+    return get_transport().version()
+
+
+def bump_version():
+    """
+    Publishes a new message version stamp to every process.
+    """
+    version = uuid4().hex
+    get_transport().publish(version)
+    return version
+
+
+def mark_pending(name):
+    """
+    Records that the current thread has uncommitted changes of the named
+    kind, e.g. 'messages'.
+    """
+    if not hasattr(_pending, 'names'):
+        _pending.names = set()
+    _pending.names.add(name)
+
+
+def clear_pending(name):
+    getattr(_pending, 'names', set()).discard(name)
+
+
+def has_pending(name):
+    """
+    Returns True if the current thread has uncommitted changes of the named
+    kind. Changes left by a rolled back transaction are forgotten once the
+    connection leaves its atomic block.
+    """
+    names = getattr(_pending, 'names', None)
+    if not names or name not in names:
+        return False
+    if transaction.get_connection().in_atomic_block:
+        return True
+    names.clear()
+    return False
+
+
+def get_tag_version():
+    """
+    Returns the tag catalogue version stamp, kept in the message cache.
+    """
+    cache = get_cache()
+    version = cache.get(TAG_VERSION_KEY)
+    if version is None:
+        cache.add(TAG_VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(TAG_VERSION_KEY)
+    return version
+
+
+def bump_tag_version():
+    """
+    Sets a new tag catalogue version stamp.
+    """
+    version = uuid4().hex
+    get_cache().set(TAG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+class LRUCache(object):
+    """
+    A bounded, thread-safe mapping that evicts the least recently used key.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TagResolver(object):
+    """
+    Process-local map of tag names to ids, reloaded with a single query
+    when the tag catalogue version changes.
+    """
+    def __init__(self):
+        self._version = None
+        self._ids = {}
+        self._lock = Lock()
+
+    def tag_ids(self):
+        from persistent_message.models import Tag
+
+        if has_pending('tags'):
+            return dict(Tag.objects.values_list('name', 'pk'))
+
+        version = get_tag_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._ids = dict(Tag.objects.values_list('name', 'pk'))
+                    self._version = version
+        return self._ids
+
+    def clear(self):
+        self._version = None
+        self._ids = {}
+
+
+class ActiveMessageSet(object):
+    """
+    The messages active between two begins/expires boundaries, ordered as
+    active_messages() orders them. An expires of None means no later
+    boundary is known. Messages are indexed by level and tag name, as sets
+    of positions in the ordered list, and serialized payloads built from
+    the set can be kept in its payloads cache.
+    """
+    def __init__(self, version, messages, begins=None, expires=None):
+        self.version = version
+        self.messages = messages
+        self.begins = begins
+        self.expires = expires
+        self.payloads = LRUCache(maxsize=256)
+
+        levels = defaultdict(set)
+        tags = defaultdict(set)
+        for position, message in enumerate(messages):
+            levels[message.level].add(position)
+            for name in message.tag_names:
+                tags[name].add(position)
+
+        self._levels = {k: frozenset(v) for k, v in levels.items()}
+        self._tags = {k: frozenset(v) for k, v in tags.items()}
+
+    def filter(self, level=None, tags=[]):
+        positions = None
+        if len(tags):
+            positions = frozenset().union(
+                *[self._tags.get(name, ()) for name in tags])
+
+        if level is not None:
+            level_positions = self._levels.get(level, frozenset())
+            positions = level_positions if (
+                positions is None) else positions & level_positions
+
+        if positions is None:
+            return list(self.messages)
+
+        return [self.messages[p] for p in sorted(positions)]
+
+
+class MessageTimeline(object):
+    """
+    The messages that have not expired at build time, with a sorted list
+    of their begins/expires boundaries. The active set for an instant is
+    found with a binary search of the boundaries, and is computed once per
+    interval between boundaries.
+    """
+    def __init__(self, version, messages, built_at):
+        self.version = version
+        self.messages = messages
+        self.built_at = built_at
+        self.boundaries = sorted(
+            {m.begins for m in messages} |
+            {m.expires for m in messages if m.expires is not None})
+        self._active_sets = {}
+
+    def is_valid(self, version, now):
+        return version == self.version and now >= self.built_at
+
+    def active_set(self, now):
+        index = bisect_right(self.boundaries, now)
+        try:
+            return self._active_sets[index]
+        except KeyError:
+            pass
+
+        if index:
+            begins = self.boundaries[index - 1]
+            messages = [m for m in self.messages if m.is_active(begins)]
+        else:
+            begins = None
+            messages = []
+
+        expires = self.boundaries[index] if (
+            index < len(self.boundaries)) else None
+
+        active_set = ActiveMessageSet(
+            self.version, messages, begins=begins, expires=expires)
+        self._active_sets[index] = active_set
+        return active_set
+
+
+class ActiveMessageCache(object):
+    """
+    Process-local cache of active messages and their tags.
+    """
+    def __init__(self):
+        self._timeline = None
+        self._lock = Lock()
+
+    def active_set(self, now=None):
+        from persistent_message.models import Message
+
+        if now is None:
+            now = Message.current_datetime()
+
+        # Uncommitted changes are seen by this thread, but never cached
+        if has_pending('messages'):
+            return self._build(uuid4().hex, now).active_set(now)
+
+        version = get_version()
+        timeline = self._timeline
+        hit = timeline is not None and timeline.is_valid(version, now)
+        cache_result('active_messages', hit)
+        if not hit:
+            with self._lock:
+                timeline = self._timeline
+                if timeline is None or not timeline.is_valid(version, now):
+                    timeline = self._build(version, now)
+                    self._timeline = timeline
+
+        return timeline.active_set(now)
+
+    async def aactive_set(self, now=None):
+        """
+        Async counterpart of active_set, which only leaves the event loop
+        when the timeline must be rebuilt.
+        """
+        from persistent_message.models import Message
+
+        if now is None:
+            now = Message.current_datetime()
+
+        version = await get_transport().aversion()
+        timeline = self._timeline
+        if timeline is not None and timeline.is_valid(version, now) and (
+                not has_pending('messages')):
+            cache_result('active_messages', True)
+            return timeline.active_set(now)
+
+        return await sync_to_async(self.active_set)(now)
+
+    def active_messages(self, level=None, tags=[], now=None):
+        return self.active_set(now).filter(level=level, tags=tags)
+
+    async def aactive_messages(self, level=None, tags=[], now=None):
+        active_set = await self.aactive_set(now)
+        return active_set.filter(level=level, tags=tags)
+
+    def clear(self):
+        self._timeline = None
+
+    def _build(self, version, now):
+        from persistent_message.models import Message
+
+        messages = list(Message.objects.filter(
+            Q(expires__gt=now) | Q(expires__isnull=True)).order_by(
+                '-level', '-begins', 'pk').prefetch_related('tags'))
+        for message in messages:
+            message.tag_names = frozenset(t.name for t in message.tags.all())
+
+        return MessageTimeline(version, messages, now)
+
+
+active_message_cache = ActiveMessageCache()
+
+tag_resolver = TagResolver()
+
+template_cache = LRUCache(maxsize=getattr(
+    settings, 'PERSISTENT_MESSAGE_TEMPLATE_CACHE_SIZE', 128))
+
+sanitize_cache = LRUCache(maxsize=getattr(
+    settings, 'PERSISTENT_MESSAGE_SANITIZE_CACHE_SIZE', 256))
@@ -0,0 +1,77 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from persistent_message.models import Message, render_messages
+
+
+def message_tags(request):
+    return []
+
+
+def message_context(request):
+    return {}
+
+
+class RequestMessages(object):
+    """
+    The active messages for a request, resolved and rendered on first
+    access. Iterating yields (message, html) tuples.
+    """
+    def __init__(self, request):
+        self.request = request
+        self._messages = None
+        self._rendered = None
+
+    @property
+    def tags(self):
+        func = import_string(getattr(
+            settings, 'PERSISTENT_MESSAGE_TAGS_MODULE',
+            'persistent_message.context_processors.message_tags'))
+        return func(self.request)
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            self._messages = Message.objects.cached_active_messages(
+                tags=self.tags)
+        return self._messages
+
+    @property
+    def rendered(self):
+        if self._rendered is None:
+            func = import_string(getattr(
+                settings, 'PERSISTENT_MESSAGE_CONTEXT_MODULE',
+                'persistent_message.context_processors.message_context'))
+            self._rendered = render_messages(
+                self.messages, func(self.request))
+        return self._rendered
+
+    def __iter__(self):
+        return iter(self.rendered)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __bool__(self):
+        return len(self.messages) > 0
+
+
+def get_request_messages(request):
+    """
+    Returns the RequestMessages for a request, memoized on the request.
+    """
+    try:
+        return request._persistent_messages
+    except AttributeError:
+        request._persistent_messages = RequestMessages(request)
+        return request._persistent_messages
+
+
+def persistent_messages(request):
+    """
+    Template context processor that adds a lazy persistent_messages
+    accessor to the context.
+    """
+    return {'persistent_messages': get_request_messages(request)}
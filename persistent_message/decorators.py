@@ -3,26 +3,71 @@
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.module_loading import import_string
 from django.shortcuts import render
+import time
+
+SESSION_KEY = 'persistent_message_admin'
+
+_auth_func = None
 
 
 def is_message_admin(request):
     return request.user.is_superuser
 
 
+def get_auth_func():
+    """
+    Returns the callable named by PERSISTENT_MESSAGE_AUTH_MODULE, resolved
+    once and memoized until the setting changes.
+    """
+    global _auth_func
+    if _auth_func is None:
+        _auth_func = import_string(getattr(
+            settings, 'PERSISTENT_MESSAGE_AUTH_MODULE',
+            'persistent_message.decorators.is_message_admin'))
+    return _auth_func
+
+
+@receiver(setting_changed)
+def reset_auth_func(setting, **kwargs):
+    global _auth_func
+    if setting == 'PERSISTENT_MESSAGE_AUTH_MODULE':
+        _auth_func = None
+
+
+def is_authorized(request):
+    """
+    Calls the auth callable, caching its decision in the user's session for
+    PERSISTENT_MESSAGE_AUTH_CACHE_TIMEOUT seconds, if set.
+    """
+    timeout = getattr(settings, 'PERSISTENT_MESSAGE_AUTH_CACHE_TIMEOUT', 0)
+    session = getattr(request, 'session', None)
+    if not timeout or session is None:
+        return get_auth_func()(request)
+
+    now = time.time()
+    try:
+        user_pk, authorized, expires = session[SESSION_KEY]
+        if user_pk == request.user.pk and now < expires:
+            return authorized
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    authorized = bool(get_auth_func()(request))
+    session[SESSION_KEY] = [request.user.pk, authorized, now + timeout]
+    return authorized
+
+
 def message_admin_required(view_func):
     """
     View decorator that checks whether the user is permitted to administer
     messages. Calls login_required in case the user is not authenticated.
     """
     def wrapper(request, *args, **kwargs):
-        func_str = getattr(
-            settings, 'PERSISTENT_MESSAGE_AUTH_MODULE',
-            'persistent_message.decorators.is_message_admin')
-        auth_func = import_string(func_str)
-
-        if auth_func(request):
+        if is_authorized(request):
             return view_func(request, *args, **kwargs)
 
         return render(request, 'access_denied.html', status=401)
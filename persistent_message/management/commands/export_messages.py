@@ -0,0 +1,23 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.core.management.base import BaseCommand
+from persistent_message.bulk import (
+    export_messages, iter_ndjson, iter_json_array)
+
+
+class Command(BaseCommand):
+    help = 'Exports all messages as JSON or newline-delimited JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['ndjson', 'json'],
+                            default='ndjson')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        messages = export_messages(chunk_size=options['chunk_size'])
+        content = iter_ndjson(messages) if (
+            options['format'] == 'ndjson') else iter_json_array(messages)
+
+        for chunk in content:
+            self.stdout.write(chunk.decode('utf-8'), ending='')
@@ -0,0 +1,39 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from persistent_message.bulk import parse_messages, import_messages
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Imports messages from a JSON or newline-delimited JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for stdin')
+        parser.add_argument('--modified-by', default='',
+                            help='Username recorded as the message author')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            data = sys.stdin.read()
+        else:
+            with open(options['path'], encoding='utf-8') as f:
+                data = f.read()
+
+        try:
+            items = parse_messages(data)
+        except ValidationError as ex:
+            raise CommandError(ex.message)
+
+        messages, errors = import_messages(
+            items, modified_by=options['modified_by'])
+
+        for error in errors:
+            self.stderr.write('Message {index}: {error}'.format(**error))
+        if len(errors):
+            raise CommandError('No messages imported, {} invalid'.format(
+                len(errors)))
+
+        self.stdout.write('Imported {} messages'.format(len(messages)))
@@ -0,0 +1,24 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.core.management.base import BaseCommand
+from persistent_message.scheduler import MessageScheduler
+
+
+class Command(BaseCommand):
+    help = ('Prepares message bundles ahead of each message begins/expires '
+            'boundary')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead', type=float, default=None,
+                            help='Seconds before a boundary to prepare it')
+        parser.add_argument('--once', action='store_true',
+                            help='Prepare the next boundary if due, and exit')
+
+    def handle(self, *args, **options):
+        scheduler = MessageScheduler(lead=options['lead'])
+        if options['once']:
+            delay = scheduler.run_pending()
+            self.stdout.write('Next run due in {:.0f} seconds'.format(delay))
+        else:
+            scheduler.run()
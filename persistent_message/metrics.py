@@ -0,0 +1,197 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver, Signal
+from django.utils.module_loading import import_string
+from functools import wraps
+from logging import getLogger
+from threading import Lock
+import time
+
+logger = getLogger(__name__)
+
+DURATION = 'persistent_message_duration_seconds'
+QUERIES = 'persistent_message_queries'
+PAYLOAD_SIZE = 'persistent_message_payload_size'
+CACHE = 'persistent_message_cache_total'
+
+# Sent for each recorded sample, with name, value, kind and labels arguments
+metric_recorded = Signal()
+
+_sinks = None
+
+
+def get_sinks():
+    """
+    Returns the metric sinks named by PERSISTENT_MESSAGE_METRICS_SINKS,
+    created once and memoized until the setting changes.
+    """
+    global _sinks
+    if _sinks is None:
+        _sinks = tuple(import_string(path)() for path in getattr(
+            settings, 'PERSISTENT_MESSAGE_METRICS_SINKS', []))
+    return _sinks
+
+
+@receiver(setting_changed)
+def reset_sinks(setting, **kwargs):
+    global _sinks
+    if setting == 'PERSISTENT_MESSAGE_METRICS_SINKS':
+        _sinks = None
+
+
+def observe(name, value, **labels):
+    for sink in get_sinks():
+        sink.record(name, value, 'summary', labels)
+
+
+def increment(name, value=1, **labels):
+    for sink in get_sinks():
+        sink.record(name, value, 'counter', labels)
+
+
+def cache_result(cache, hit):
+    if get_sinks():
+        increment(CACHE, cache=cache, result='hit' if hit else 'miss')
+
+
+def instrument(operation, size=None):
+    """
+    Decorator that records the duration and query count of each call, and
+    the size of the result if a size callable is given. Calls are passed
+    straight through when no sink is configured.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not get_sinks():
+                return func(*args, **kwargs)
+
+            queries = [0]
+
+            def count_query(execute, *args):
+                queries[0] += 1
+                return execute(*args)
+
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_query):
+                result = func(*args, **kwargs)
+            observe(DURATION, time.perf_counter() - start,
+                    operation=operation)
+            observe(QUERIES, queries[0], operation=operation)
+
+            if size is not None:
+                value = size(result)
+                if value is not None:
+                    observe(PAYLOAD_SIZE, value, operation=operation)
+            return result
+        return wrapper
+    return decorator
+
+
+def response_size(response):
+    return None if response.streaming else len(response.content)
+
+
+class Sink(object):
+    def record(self, name, value, kind, labels):
+        raise NotImplementedError()
+
+
+class SignalSink(Sink):
+    """
+    Sends the metric_recorded signal for each sample.
+    """
+    def record(self, name, value, kind, labels):
+        metric_recorded.send(sender=self.__class__, name=name, value=value,
+                             kind=kind, labels=labels)
+
+
+class LoggingSink(Sink):
+    """
+    Logs each sample to the persistent_message.metrics logger.
+    """
+    def record(self, name, value, kind, labels):
+        logger.info('{} {} {}'.format(name, ','.join('{}={}'.format(k, v) for (
+            k, v) in sorted(labels.items())), value))
+
+
+class Registry(object):
+    """
+    An in-memory, thread-safe store of counters and summaries, exposed in
+    the Prometheus text format.
+    """
+    def __init__(self):
+        self._counters = {}
+        self._summaries = {}
+        self._lock = Lock()
+
+    def increment(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total = self._summaries.get(key, (0, 0))
+            self._summaries[key] = (count + 1, total + value)
+
+    def counter(self, name, **labels):
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def summary(self, name, **labels):
+        return self._summaries.get(
+            (name, tuple(sorted(labels.items()))), (0, 0))
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+    def exposition(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+
+        lines = []
+        name = None
+        for (metric, labels), value in counters:
+            if metric != name:
+                name = metric
+                lines.append('# TYPE {} counter'.format(name))
+            lines.append('{}{} {}'.format(metric, _labels(labels), value))
+
+        for (metric, labels), (count, total) in summaries:
+            if metric != name:
+                name = metric
+                lines.append('# TYPE {} summary'.format(name))
+            lines.append('{}_count{} {}'.format(
+                metric, _labels(labels), count))
+            lines.append('{}_sum{} {}'.format(metric, _labels(labels), total))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace(
+        '\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+
+registry = Registry()
+
+
+class RegistrySink(Sink):
+    """
+    Records each sample in the in-memory registry, read by the metrics view.
+    """
+    def record(self, name, value, kind, labels):
+        if kind == 'counter':
+            registry.increment(name, value, labels)
+        else:
+            registry.observe(name, value, labels)
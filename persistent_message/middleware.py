@@ -0,0 +1,16 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from persistent_message.context_processors import get_request_messages
+
+
+class PersistentMessageMiddleware(object):
+    """
+    Adds a lazy persistent_messages accessor to each request.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.persistent_messages = get_request_messages(request)
+        return self.get_response(request)
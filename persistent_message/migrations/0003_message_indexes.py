@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:31
+
+from django.db import migrations, models
+
+MESSAGE_TAGS_INDEX = models.Index(
+    fields=['tag', 'message'], name='pm_message_tags_tag_msg_idx')
+
+
+def add_message_tags_index(apps, schema_editor):
+    through = apps.get_model('persistent_message', 'Message').tags.through
+    schema_editor.add_index(through, MESSAGE_TAGS_INDEX)
+
+
+def remove_message_tags_index(apps, schema_editor):
+    through = apps.get_model('persistent_message', 'Message').tags.through
+    schema_editor.remove_index(through, MESSAGE_TAGS_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('persistent_message', '0002_auto_20220421_2356'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['level', 'begins', 'expires'], name='pm_message_level_begins_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('expires__isnull', False)), fields=['expires'], name='pm_message_expires_idx'),
+        ),
+        migrations.RunPython(
+            add_message_tags_index, remove_message_tags_index),
+    ]
@@ -1,13 +1,23 @@
 # Copyright 2025 UW-IT, University of Washington
 # SPDX-License-Identifier: Apache-2.0
 
+from django.conf import settings
 from django.db import models
-from django.db.models import Q
+from django.db.models import BooleanField, Case, Q, Value, When
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.template import Template, Context
-from django.utils import timezone
+from django.template.base import Node, TextNode, VariableNode
+from django.template.defaulttags import CommentNode
+from django.utils import timezone, translation
+from django.utils.safestring import mark_safe
+from persistent_message.cache import (
+    active_message_cache, template_cache, sanitize_cache, get_cache)
+from persistent_message.metrics import instrument, cache_result
+from datetime import datetime
+import hashlib
 import nh3
+import re
 
 MESSAGE_ALLOWED_TAGS = {
     'a', 'b', 'br', 'p', 'span', 'h1', 'h2', 'h3', 'h4',
@@ -17,17 +27,17 @@ MESSAGE_ALLOWED_ATTRIBUTES = {
     'a': {'href', 'rel'},
     'img': {'alt'},
 }
+TEMPLATE_TOKEN_RE = re.compile(r'{[{%#]')
+CACHEABLE_CONTEXT_TYPES = (str, int, float, type(None))
 
 
 class TagGroup(models.Model):
     name = models.CharField(max_length=50, unique=True)
 
     def to_json(self):
-        return {
-            'id': self.pk,
-            'name': self.name,
-            'tags': [t.to_json() for t in self.tag_set.all()],
-        }
+        from persistent_message.serializers import serialize_tag_group
+        return serialize_tag_group(
+            self.pk, self.name, [t.to_json() for t in self.tag_set.all()])
 
     def __str__(self):
         return self.name
@@ -38,19 +48,39 @@ class Tag(models.Model):
     group = models.ForeignKey(TagGroup, on_delete=models.CASCADE)
 
     def to_json(self):
-        return {
-            'id': self.pk,
-            'name': self.name,
-            'group': str(self.group),
-        }
+        from persistent_message.serializers import serialize_tag
+        return serialize_tag(self.pk, self.name, str(self.group))
 
     def __str__(self):
         return self.name
 
 
+class MessageQuerySet(models.QuerySet):
+    """
+    QuerySet that records metrics for its evaluation under operation, if
+    set. Lookups return lazy querysets, so they are measured when the
+    results are fetched.
+    """
+    operation = None
+
+    def _clone(self):
+        clone = super(MessageQuerySet, self)._clone()
+        clone.operation = self.operation
+        return clone
+
+    def _fetch_all(self):
+        if self.operation is None or self._result_cache is not None:
+            return super(MessageQuerySet, self)._fetch_all()
+        instrument(self.operation)(super(MessageQuerySet, self)._fetch_all)()
+
+
 class MessageManager(models.Manager):
-    def active_messages(self, level=None, tags=[]):
-        now = Message.current_datetime()
+    def get_queryset(self):
+        return MessageQuerySet(self.model, using=self._db)
+
+    def active_messages(self, level=None, tags=[], now=None):
+        if now is None:
+            now = Message.current_datetime()
 
         kwargs = {'begins__lte': now}
         if level is not None:
@@ -59,9 +89,46 @@ class MessageManager(models.Manager):
         if len(tags):
             kwargs['tags__name__in'] = tags
 
-        return super(MessageManager, self).get_queryset().filter(
+        queryset = self.get_queryset().filter(
             Q(expires__gt=now) | Q(expires__isnull=True), **kwargs).order_by(
-                '-level', '-begins').distinct()
+                '-level', '-begins', 'pk').distinct()
+        queryset.operation = 'active_messages'
+        return queryset
+
+    def active_first(self, now=None):
+        """
+        Returns all messages annotated with their active state, ordered by
+        active state, then by most recently modified and then by id.
+        """
+        if now is None:
+            now = Message.current_datetime()
+
+        is_active = Q(begins__lte=now) & (
+            Q(expires__gt=now) | Q(expires__isnull=True))
+
+        return super(MessageManager, self).get_queryset().annotate(
+            active=Case(When(is_active, then=Value(True)),
+                        default=Value(False),
+                        output_field=BooleanField())).order_by(
+                '-active', '-modified', '-pk')
+
+    async def aactive_messages(self, level=None, tags=[]):
+        """
+        Async counterpart of cached_active_messages, which only leaves the
+        event loop when the cache must be rebuilt.
+        """
+        return await active_message_cache.aactive_messages(
+            level=level, tags=tags)
+
+    @instrument('cached_active_messages')
+    def cached_active_messages(self, level=None, tags=[]):
+        """
+        Returns a list of the active messages from a process-local cache,
+        which is rebuilt when a message changes or when a begins/expires
+        boundary is reached. The returned messages are shared, and should
+        be treated as read-only.
+        """
+        return active_message_cache.active_messages(level=level, tags=tags)
 
 
 class Message(models.Model):
@@ -88,14 +155,31 @@ class Message(models.Model):
 
     objects = MessageManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['level', 'begins', 'expires'],
+                         name='pm_message_level_begins_idx'),
+            models.Index(fields=['expires'],
+                         condition=Q(expires__isnull=False),
+                         name='pm_message_expires_idx'),
+        ]
+
     def is_active(self, now=None):
         if not now:
             now = self.current_datetime()
         return (self.begins is not None and self.begins <= now and (
             self.expires is None or now < self.expires))
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Message, cls).from_db(db, field_names, values)
+        instance._loaded_content = instance.__dict__.get('content')
+        return instance
+
     def clean(self):
-        self.content = self.sanitize_content(self.content)
+        # Content is sanitized on save, so unchanged content is skipped
+        if self.content != getattr(self, '_loaded_content', None):
+            self.content = self.sanitize_content(self.content)
 
         if (self.begins is None or self.begins == ''):
             self.begins = self.current_datetime()
@@ -106,39 +190,191 @@ class Message(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean(exclude=['begins', 'modified_by'])
         super(Message, self).save(*args, **kwargs)
+        self._loaded_content = self.content
 
     def to_json(self, now=None):
-        return {
-            'id': self.pk,
-            'content': self.content,
-            'level': self.level,
-            'level_name': self.get_level_display(),
-            'begins': self.begins.isoformat() if (
-                self.begins is not None) else None,
-            'expires': self.expires.isoformat() if (
-                self.expires is not None) else None,
-            'created': self.created.isoformat() if (
-                self.created is not None) else None,
-            'modified': self.modified.isoformat() if (
-                self.modified is not None) else None,
-            'modified_by': self.modified_by,
-            'tags': [tag.to_json() for tag in self.tags.all()],
-            'is_active': self.is_active(now),
-        }
+        from persistent_message.serializers import (
+            serialize_message, MESSAGE_VALUES)
+        if not now:
+            now = self.current_datetime()
+
+        json_data = serialize_message(
+            {field: getattr(self, field) for field in MESSAGE_VALUES},
+            [tag.to_json() for tag in self.tags.all()], now)
+        return {key: value.isoformat() if isinstance(value, datetime) else (
+            value) for key, value in json_data.items()}
+
+    def get_template(self):
+        """
+        Returns the compiled template for the message content, or None if
+        the content contains no template tokens. Templates for saved
+        messages are cached by (pk, modified).
+        """
+        return self._compiled()[0]
+
+    def context_keys(self):
+        """
+        Returns the set of context keys that the rendered message depends
+        on, or None if they cannot be determined from the template.
+        """
+        return self._compiled()[1]
+
+    def _compiled(self):
+        if not TEMPLATE_TOKEN_RE.search(self.content):
+            return None, frozenset()
+
+        if self.pk is None or self.modified is None:
+            template = Template(self.content)
+            return template, _template_context_keys(template)
+
+        key = (self.pk, self.modified)
+        cached = template_cache.get(key)
+        hit = cached is not None and cached[0] == self.content
+        cache_result('template', hit)
+        if hit:
+            return cached[1:]
 
+        template = Template(self.content)
+        context_keys = _template_context_keys(template)
+        template_cache.set(key, (self.content, template, context_keys))
+        return template, context_keys
+
+    @instrument('render', size=len)
     def render(self, context={}):
-        return Template(self.content).render(Context(context))
+        return self._render(Context(context))
+
+    async def arender(self, context={}):
+        """
+        Async counterpart of render. Compiled templates are rendered on the
+        event loop, without a rendered HTML cache lookup, so the context
+        must not need database access.
+        """
+        template = self.get_template()
+        if template is None:
+            return mark_safe(self.content)
+        return template.render(Context(context))
+
+    def _render(self, context):
+        template, context_keys = self._compiled()
+        if template is None:
+            return mark_safe(self.content)
+
+        timeout = getattr(
+            settings, 'PERSISTENT_MESSAGE_RENDER_CACHE_TIMEOUT', 3600)
+        cache_key = self._render_cache_key(context_keys, context) if (
+            timeout and self.pk is not None and
+            self.modified is not None) else None
+        if cache_key is None:
+            return template.render(context)
+
+        cache = get_cache()
+        html = cache.get(cache_key)
+        cache_result('render', html is not None)
+        if html is None:
+            html = template.render(context)
+            cache.set(cache_key, html, timeout=timeout)
+        return mark_safe(html)
+
+    def _render_cache_key(self, context_keys, context):
+        """
+        Returns a cache key for the rendered message, from the message
+        version and content, the context values it depends on and the
+        active language and time zone, or None if the rendered message
+        should not be cached.
+        """
+        if context_keys is None:
+            return None
+
+        fingerprint = []
+        for key in sorted(context_keys):
+            if key in context:
+                value = context[key]
+                if not isinstance(value, CACHEABLE_CONTEXT_TYPES):
+                    return None
+                fingerprint.append((key, type(value).__name__, value))
+            else:
+                fingerprint.append((key,))
+        fingerprint.append(translation.get_language())
+        fingerprint.append(timezone.get_current_timezone_name())
+
+        digest = hashlib.sha1(self.content.encode('utf-8'))
+        digest.update(repr(fingerprint).encode('utf-8'))
+        return 'persistent_message.html.{}.{}.{}'.format(
+            self.pk, self.modified.timestamp(), digest.hexdigest())
 
     @staticmethod
     def current_datetime():
         return timezone.now()
 
     @staticmethod
+    @instrument('sanitize_content', size=len)
     def sanitize_content(content):
-        return nh3.clean(content,
-                         tags=MESSAGE_ALLOWED_TAGS,
-                         attributes=MESSAGE_ALLOWED_ATTRIBUTES,
-                         link_rel=None)
+        """
+        Returns sanitized content. Results are memoized by a hash of the
+        content, so identical content is sanitized once.
+        """
+        if not isinstance(content, str):
+            return _sanitize(content)
+
+        key = hashlib.sha256(content.encode('utf-8')).digest()
+        sanitized = sanitize_cache.get(key)
+        cache_result('sanitize', sanitized is not None)
+        if sanitized is None:
+            sanitized = _sanitize(content)
+            sanitize_cache.set(key, sanitized)
+        return sanitized
 
     def __str__(self):
         return self.content
+
+
+def _sanitize(content):
+    return nh3.clean(content,
+                     tags=MESSAGE_ALLOWED_TAGS,
+                     attributes=MESSAGE_ALLOWED_ATTRIBUTES,
+                     link_rel=None)
+
+
+def _template_context_keys(template):
+    """
+    Returns the top-level context keys referenced by a template's variable
+    nodes and filter arguments, or None if the template contains tags whose
+    context dependencies are unknown.
+    """
+    keys = set()
+    for node in template.nodelist.get_nodes_by_type(Node):
+        if isinstance(node, (TextNode, CommentNode)):
+            continue
+        if not isinstance(node, VariableNode):
+            return None
+
+        variables = [node.filter_expression.var]
+        for func, args in node.filter_expression.filters:
+            variables.extend([arg for lookup, arg in args if lookup])
+
+        for variable in variables:
+            if getattr(variable, 'lookups', None):
+                keys.add(variable.lookups[0])
+
+    return frozenset(keys)
+
+
+def render_messages(messages, context={}):
+    """
+    Renders each message against a single context, returning a list of
+    (message, html) tuples.
+    """
+    return list(iter_render_messages(messages, context))
+
+
+def iter_render_messages(messages, context={}):
+    """
+    Generator variant of render_messages, yielding (message, html) tuples
+    as each message is rendered.
+    """
+    context = Context(context)
+    for message in messages:
+        # Variables set by one message are not seen by the next
+        with context.push():
+            html = message._render(context)
+        yield message, html
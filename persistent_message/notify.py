@@ -0,0 +1,224 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from logging import getLogger
+from threading import Lock, Thread
+from uuid import uuid4
+import os
+import select
+import tempfile
+import time
+
+logger = getLogger(__name__)
+
+VERSION_KEY = 'persistent_message.version'
+
+_transport = None
+_transport_lock = Lock()
+
+
+def get_transport():
+    """
+    Returns the change-notification transport named by
+    PERSISTENT_MESSAGE_NOTIFY_TRANSPORT, created once with the keyword
+    arguments in PERSISTENT_MESSAGE_NOTIFY_OPTIONS.
+    """
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                transport_class = import_string(getattr(
+                    settings, 'PERSISTENT_MESSAGE_NOTIFY_TRANSPORT',
+                    'persistent_message.notify.CacheTransport'))
+                _transport = transport_class(**getattr(
+                    settings, 'PERSISTENT_MESSAGE_NOTIFY_OPTIONS', {}))
+    return _transport
+
+
+@receiver(setting_changed)
+def reset_transport(setting, **kwargs):
+    global _transport
+    if setting in ('PERSISTENT_MESSAGE_NOTIFY_TRANSPORT',
+                   'PERSISTENT_MESSAGE_NOTIFY_OPTIONS',
+                   'PERSISTENT_MESSAGE_CACHE_ALIAS'):
+        _transport = None
+
+
+class Transport(object):
+    """
+    Publishes message version stamps to, and reads the current version
+    stamp from, every process. A published version is seen immediately by
+    the publishing process.
+    """
+    def publish(self, version):
+        raise NotImplementedError()
+
+    def version(self):
+        raise NotImplementedError()
+
+    async def aversion(self):
+        return await sync_to_async(self.version)()
+
+
+class CacheTransport(Transport):
+    """
+    Keeps the version stamp in Django's cache framework, reading it at most
+    once per interval seconds.
+    """
+    def __init__(self, interval=1.0, cache_alias=None):
+        self.interval = interval
+        self.cache_alias = cache_alias or getattr(
+            settings, 'PERSISTENT_MESSAGE_CACHE_ALIAS', 'default')
+        self._version = None
+        self._next_poll = 0
+
+    def publish(self, version):
+        caches[self.cache_alias].set(VERSION_KEY, version, timeout=None)
+        self._set_version(version)
+
+    def version(self):
+        if self._version is None or time.monotonic() >= self._next_poll:
+            self._set_version(self._read_version())
+        return self._version
+
+    async def aversion(self):
+        if self._version is None or time.monotonic() >= self._next_poll:
+            version = await caches[self.cache_alias].aget(VERSION_KEY)
+            if version is None:
+                return await sync_to_async(self.version)()
+            self._set_version(version)
+        return self._version
+
+    def _set_version(self, version):
+        self._version = version
+        self._next_poll = time.monotonic() + self.interval
+
+    def _read_version(self):
+        cache = caches[self.cache_alias]
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid4().hex, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+
+class PostgresTransport(CacheTransport):
+    """
+    Keeps the version stamp in Django's cache framework, and publishes it
+    with PostgreSQL NOTIFY. A listener thread updates the version when a
+    notification arrives, so the cache is only read while the listener is
+    not connected.
+    """
+    def __init__(self, channel='persistent_message', using='default',
+                 **kwargs):
+        super(PostgresTransport, self).__init__(**kwargs)
+        self.channel = channel
+        self.using = using
+        self._listening = False
+        self._thread = None
+        self._lock = Lock()
+
+    def publish(self, version):
+        super(PostgresTransport, self).publish(version)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, version])
+
+    def version(self):
+        self._start()
+        if self._listening and self._version is not None:
+            return self._version
+        return super(PostgresTransport, self).version()
+
+    async def aversion(self):
+        self._start()
+        if self._listening and self._version is not None:
+            return self._version
+        return await super(PostgresTransport, self).aversion()
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, daemon=True,
+                                          name='persistent-message-listener')
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as ex:
+                logger.warning('Message listener disconnected: {}'.format(ex))
+            self._listening = False
+            time.sleep(self.interval or 1)
+
+    def _listen(self):
+        connection = connections.create_connection(self.using)
+        connection.ensure_connection()
+        connection.set_autocommit(True)
+        try:
+            conn = connection.connection
+            conn.cursor().execute('LISTEN "{}"'.format(self.channel))
+
+            # Notifications before LISTEN may have been missed
+            self._version = self._read_version()
+            self._listening = True
+
+            if callable(getattr(conn, 'notifies', None)):  # psycopg 3
+                for notify in conn.notifies():
+                    self._version = notify.payload
+            else:  # psycopg2
+                while True:
+                    select.select([conn], [], [], 60)
+                    conn.poll()
+                    while conn.notifies:
+                        self._version = conn.notifies.pop(0).payload
+        finally:
+            connection.close()
+
+
+class FileTransport(Transport):
+    """
+    Keeps the version stamp in a file shared by the processes on one host,
+    re-reading it when the file's modification time changes. Intended for
+    tests and single-host deployments.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(
+            tempfile.gettempdir(), 'persistent_message.version')
+        self._version = None
+        self._stat = None
+
+    def publish(self, version):
+        directory, name = os.path.split(self.path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=name)
+        with os.fdopen(fd, 'w') as f:
+            f.write(version)
+        os.replace(temp_path, self.path)
+        self._stat = None
+        self._version = version
+
+    def version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.publish(uuid4().hex)
+            return self._version
+
+        stat = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stat != self._stat:
+            with open(self.path) as f:
+                self._version = f.read()
+            self._stat = stat
+        return self._version
+
+    async def aversion(self):
+        # A stat of a local file does not need a thread
+        return self.version()
@@ -0,0 +1,74 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.conf import settings
+from django.db import close_old_connections
+from persistent_message.bundles import rebuild_bundles, pop_bundles_dirty
+from persistent_message.cache import active_message_cache
+from persistent_message.models import Message
+from logging import getLogger
+import time
+
+logger = getLogger(__name__)
+
+
+class MessageScheduler(object):
+    """
+    Prepares message bundles for each begins/expires boundary, lead seconds
+    before it is reached. Each bundle carries the bundle for the following
+    active set, which readers switch to at the boundary, so no version is
+    published and no cache is missed when a message begins or expires.
+    Bundles marked dirty by a message change are rebuilt on the next run.
+    """
+    def __init__(self, lead=None, interval=None):
+        self.lead = lead if lead is not None else getattr(
+            settings, 'PERSISTENT_MESSAGE_SCHEDULER_LEAD', 30)
+        self.interval = interval if interval is not None else getattr(
+            settings, 'PERSISTENT_MESSAGE_SCHEDULER_INTERVAL', 10)
+        self._prepared = None
+
+    def run_pending(self, now=None):
+        """
+        Prepares the next boundary if it is within the lead time and has
+        not been prepared for the current message version, or rebuilds the
+        bundles if they are marked dirty. Returns the number of seconds
+        until the next call is due.
+        """
+        if now is None:
+            now = Message.current_datetime()
+
+        active_set = active_message_cache.active_set(now)
+        boundary = active_set.expires
+        remaining = (boundary - now).total_seconds() if (
+            boundary is not None) else None
+        due = remaining is not None and remaining <= self.lead
+
+        prepared = (active_set.version, boundary)
+        if due and prepared != self._prepared:
+            pop_bundles_dirty()
+            count = rebuild_bundles(now, prepare_next=True)
+            self._prepared = prepared
+            logger.info('Prepared {} message bundles for {}'.format(
+                count, boundary.isoformat()))
+        elif pop_bundles_dirty():
+            count = rebuild_bundles(now, prepare_next=due)
+            logger.info('Rebuilt {} message bundles'.format(count))
+
+        if remaining is None:
+            return self.interval
+        if not due:
+            return min(remaining - self.lead, self.interval)
+
+        # Wake once the boundary has passed
+        return min(max(remaining, 0.01), self.interval)
+
+    def run(self):
+        while True:
+            try:
+                # Replace connections the database has dropped
+                close_old_connections()
+                delay = self.run_pending()
+            except Exception:
+                logger.exception('Message scheduler failed')
+                delay = self.interval
+            time.sleep(delay)
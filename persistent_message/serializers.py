@@ -0,0 +1,162 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+import unicodedata
+from persistent_message.models import Message, TagGroup
+from persistent_message.cache import tag_resolver
+from django.core.exceptions import ValidationError
+from collections import defaultdict
+from datetime import datetime
+import dateutil.parser
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MESSAGE_FIELDS = ['content', 'level', 'begins', 'expires', 'tags']
+MESSAGE_VALUES = ['id', 'content', 'level', 'begins', 'expires', 'created',
+                  'modified', 'modified_by']
+LEVEL_NAMES = dict(Message.LEVEL_CHOICES)
+
+
+def dumps(obj):
+    """
+    Encodes obj as JSON bytes, with datetimes in ISO 8601 format. Uses
+    orjson if it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_json_default).encode('utf-8')
+
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError('{} is not JSON serializable'.format(type(obj)))
+
+
+def message_tags(message_ids):
+    """
+    Returns a dict of message id to a list of tag JSON objects, from a
+    single query.
+    """
+    rows = Message.tags.through.objects.filter(
+        message_id__in=message_ids).order_by('tag_id').values_list(
+            'message_id', 'tag_id', 'tag__name', 'tag__group__name')
+
+    tags = defaultdict(list)
+    for message_id, tag_id, name, group in rows:
+        tags[message_id].append(serialize_tag(tag_id, name, group))
+    return tags
+
+
+def serialize_tag(tag_id, name, group):
+    """
+    Returns the JSON object of a tag, used by Tag.to_json.
+    """
+    return {'id': tag_id, 'name': name, 'group': group}
+
+
+def serialize_tag_group(group_id, name, tags):
+    """
+    Returns the JSON object of a tag group and its list of tag JSON objects,
+    used by TagGroup.to_json.
+    """
+    return {'id': group_id, 'name': name, 'tags': tags}
+
+
+def serialize_tag_groups():
+    """
+    Returns a list of tag group JSON objects, equivalent to TagGroup.to_json,
+    from a single query.
+    """
+    rows = TagGroup.objects.order_by('pk', 'tag__pk').values_list(
+        'id', 'name', 'tag__id', 'tag__name')
+
+    groups = []
+    for group_id, name, tag_id, tag_name in rows:
+        if not len(groups) or groups[-1]['id'] != group_id:
+            groups.append(serialize_tag_group(group_id, name, []))
+        if tag_id is not None:
+            groups[-1]['tags'].append(serialize_tag(tag_id, tag_name, name))
+    return groups
+
+
+def serialize_message(row, tags, now):
+    """
+    Returns the JSON object of a message, used by Message.to_json, from a
+    dict of its MESSAGE_VALUES fields and its list of tag JSON objects.
+    Datetimes are left for dumps to encode.
+    """
+    begins = row['begins']
+    expires = row['expires']
+    return {
+        'id': row['id'],
+        'content': row['content'],
+        'level': row['level'],
+        'level_name': LEVEL_NAMES.get(row['level'], row['level']),
+        'begins': begins,
+        'expires': expires,
+        'created': row['created'],
+        'modified': row['modified'],
+        'modified_by': row['modified_by'],
+        'tags': tags,
+        'is_active': (begins is not None and begins <= now and (
+            expires is None or now < expires)),
+    }
+
+
+def serialize_messages(rows, now):
+    """
+    Generator of message JSON objects, equivalent to Message.to_json, from
+    Message.objects.values(*MESSAGE_VALUES) rows. Datetimes are left for
+    dumps to encode.
+    """
+    rows = rows if isinstance(rows, list) else list(rows)
+    tags = message_tags([row['id'] for row in rows])
+    for row in rows:
+        yield serialize_message(row, tags.get(row['id'], []), now)
+
+
+def deserialize_message(message, json_data):
+    """
+    Updates a message from a JSON message object, returning the list of ids
+    of the tags named in the object, or None if the object has no tags. Tag
+    names are resolved with the process-local tag resolver.
+    """
+    if not isinstance(json_data, dict) or not any(
+            key in json_data for key in MESSAGE_FIELDS):
+        raise ValidationError('Invalid message: {}'.format(json_data))
+
+    if 'content' in json_data:
+        message.content = unicodedata.normalize(
+            "NFKD", json_data['content']).strip()
+    if 'level' in json_data:
+        message.level = json_data['level']
+    if 'begins' in json_data:
+        message.begins = _parse_datetime(json_data['begins'])
+    if 'expires' in json_data:
+        message.expires = _parse_datetime(json_data['expires'])
+
+    if 'tags' not in json_data:
+        return None
+
+    tag_ids = tag_resolver.tag_ids()
+    tags = []
+    for name in json_data['tags']:
+        try:
+            tags.append(tag_ids[name])
+        except (KeyError, TypeError):
+            raise ValidationError('Invalid tag: {}'.format(name))
+    return tags
+
+
+def _parse_datetime(value):
+    if value is None:
+        return None
+    try:
+        return dateutil.parser.parse(value)
+    except (TypeError, ValueError):
+        raise ValidationError('Invalid datetime: {}'.format(value))
@@ -0,0 +1,64 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from persistent_message.models import Message, Tag, TagGroup
+from persistent_message.cache import (
+    bump_version, bump_tag_version, mark_pending, clear_pending)
+from persistent_message.bundles import mark_bundles_dirty
+
+
+def message_changed(**kwargs):
+    """
+    Bumps the message version stamp on commit. Until then, the writing
+    thread reads its own changes from snapshots that are not cached, so a
+    rolled back change is never served. Message bundles are marked for
+    the scheduler to rebuild.
+    """
+    mark_pending('messages')
+    transaction.on_commit(messages_committed)
+    transaction.on_commit(mark_bundles_dirty, robust=True)
+
+
+def messages_committed():
+    clear_pending('messages')
+    bump_version()
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def message_saved(sender, **kwargs):
+    message_changed()
+
+
+def tags_changed(**kwargs):
+    """
+    Bumps the tag catalogue version stamp on commit. Until then, the
+    writing thread reads the catalogue without caching it.
+    """
+    mark_pending('tags')
+    transaction.on_commit(tags_committed)
+
+
+def tags_committed():
+    clear_pending('tags')
+    bump_tag_version()
+
+
+# Fixture loads send post_save with raw=True, which also lands here
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=TagGroup)
+@receiver(post_delete, sender=TagGroup)
+def tag_saved(sender, **kwargs):
+    tags_changed()
+
+
+@receiver(m2m_changed, sender=Message.tags.through)
+def message_tags_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        message_changed()
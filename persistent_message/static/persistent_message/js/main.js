@@ -72,10 +72,15 @@
             });
         }
 
-        function get_messages() {
+        function get_messages(cursor) {
+            var data = {limit: window.persistent_message.page_size};
+            if (cursor) {
+                data.cursor = cursor;
+            }
             return $.ajax({
                 url: window.persistent_message.message_api,
-                dataType: 'json'
+                dataType: 'json',
+                data: data
             });
         }
 
@@ -236,16 +241,28 @@
         function load_messages(data) {
             var template = Handlebars.compile($('#message-list-tmpl').html()),
                 i;
-            data.tag_groups = window.persistent_message.tag_groups;
-            $('#pm-content').html(template(data));
-            $('button.pm-btn-edit').click(init_edit_message);
-            $('button.pm-btn-publish, button.pm-btn-unpublish').click(toggle_publish_message);
-            $('button.pm-btn-delete').click(delete_message);
 
-            window.persistent_message.messages = {};
+            window.persistent_message.message_list.push.apply(
+                window.persistent_message.message_list, data.messages);
             for (i = 0; i < data.messages.length; i++)  {
                 window.persistent_message.messages[data.messages[i].id] = data.messages[i];
             }
+
+            $('#pm-content').html(template({
+                messages: window.persistent_message.message_list,
+                next_cursor: data.next_cursor,
+                tag_groups: window.persistent_message.tag_groups
+            }));
+            $('button.pm-btn-edit').click(init_edit_message);
+            $('button.pm-btn-publish, button.pm-btn-unpublish').click(toggle_publish_message);
+            $('button.pm-btn-delete').click(delete_message);
+            $('button.pm-btn-more').click(more_messages);
+        }
+
+        function more_messages() {
+            /*jshint validthis: true */
+            var cursor = $(this).attr('data-cursor');
+            get_messages(cursor).fail(load_error).done(load_messages);
         }
 
         function load_error(xhr) {
@@ -264,6 +281,8 @@
 
         function init_messages() {
             $('#pm-messages-link').tab('show');
+            window.persistent_message.messages = {};
+            window.persistent_message.message_list = [];
             get_messages().fail(load_error).done(load_messages);
         }
 
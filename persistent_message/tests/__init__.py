@@ -8,3 +8,14 @@ from datetime import datetime
 def mocked_current_datetime():
     dt = datetime(2018, 1, 1, 10, 10, 10)
     return timezone.make_aware(dt)
+
+
+def commit_changes():
+    """
+    Publishes pending message and tag changes as their commit would, for
+    test cases that run in a transaction that is never committed.
+    """
+    from persistent_message.signals import (
+        messages_committed, tags_committed)
+    messages_committed()
+    tags_committed()
@@ -1,13 +1,21 @@
 # Copyright 2025 UW-IT, University of Washington
 # SPDX-License-Identifier: Apache-2.0
 
-from django.contrib.auth.models import User
-from django.test import TestCase, RequestFactory
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User, AnonymousUser
+from django.db import connection
+from django.test import (
+    TestCase, RequestFactory, AsyncRequestFactory, override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone, translation
 from datetime import timedelta
+from persistent_message.cache import get_cache, tag_resolver
 from persistent_message.models import Message, Tag, TagGroup
-from persistent_message.tests import mocked_current_datetime
-from persistent_message.views.api import MessageAPI, TagGroupAPI
+from persistent_message.tests import mocked_current_datetime, commit_changes
+from persistent_message.views.api import (
+    MessageAPI, TagGroupAPI, ActiveMessageAPI, AsyncActiveMessageAPI,
+    ActiveMessageStream)
 from unittest import mock
 import json
 
@@ -16,6 +24,8 @@ class TagGroupAPITest(TestCase):
     fixtures = ['test.json']
 
     def setUp(self):
+        get_cache().clear()
+        commit_changes()
         self.factory = RequestFactory()
         self.user = User.objects.get(username='manager')
 
@@ -27,6 +37,49 @@ class TagGroupAPITest(TestCase):
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.content)
         self.assertEqual(len(data['tag_groups']), 2)
+        self.assertEqual(data['tag_groups'], [
+            group.to_json() for group in TagGroup.objects.order_by('pk')])
+
+    def test_get_cached(self):
+        TagGroup.objects.create(name='Empty')
+        request = self.factory.get(reverse('tag_groups_api'))
+        request.user = self.user
+
+        # Uncommitted changes are not cached
+        for i in range(2):
+            with self.assertNumQueries(1):
+                response = TagGroupAPI.as_view()(request)
+        self.assertNotIn('ETag', response)
+        data = json.loads(response.content)
+        self.assertEqual(data['tag_groups'][-1]['tags'], [])
+
+        commit_changes()
+        with self.assertNumQueries(1):
+            response = TagGroupAPI.as_view()(request)
+
+        with self.assertNumQueries(0):
+            cached = TagGroupAPI.as_view()(request)
+        self.assertEqual(cached.content, response.content)
+
+        # Tag changes invalidate the catalogue
+        Tag.objects.create(name='Yakima', group=TagGroup.objects.get(
+            name='Cities'))
+        commit_changes()
+        response = TagGroupAPI.as_view()(request)
+        self.assertNotEqual(response['ETag'], cached['ETag'])
+        self.assertIn(b'Yakima', response.content)
+
+    def test_get_not_modified(self):
+        request = self.factory.get(reverse('tag_groups_api'))
+        request.user = self.user
+        response = TagGroupAPI.as_view()(request)
+
+        request = self.factory.get(reverse('tag_groups_api'), headers={
+            'If-None-Match': response['ETag']})
+        request.user = self.user
+        response = TagGroupAPI.as_view()(request)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('no-cache', response['Cache-Control'])
 
 
 class MessageAPITest(TestCase):
@@ -35,6 +88,7 @@ class MessageAPITest(TestCase):
     @mock.patch('persistent_message.models.Message.current_datetime',
                 side_effect=mocked_current_datetime)
     def setUp(self, mock_dt):
+        commit_changes()
         self.factory = RequestFactory()
         self.user = User.objects.get(username='manager')
 
@@ -66,6 +120,78 @@ class MessageAPITest(TestCase):
         data = json.loads(response.content)
         self.assertEqual(len(data['messages']), 5)
 
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_get_all_order(self, mock_dt):
+        request = self.factory.get(reverse('messages_api'))
+        request.user = self.user
+        response = MessageAPI.as_view()(request)
+
+        data = json.loads(response.content)
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['4', '3', '1', '2', 'This is a test.'])
+        self.assertEqual([m['is_active'] for m in data['messages']],
+                         [True, True, True, False, False])
+
+    def test_get_all_queries(self):
+        request = self.factory.get(reverse('messages_api'))
+        request.user = self.user
+
+        # Messages, then tags with tag groups
+        with self.assertNumQueries(2):
+            response = MessageAPI.as_view()(request)
+
+        tags = Tag.objects.all()
+        for i in range(20):
+            message = Message(content='Message {}'.format(i))
+            message.save()
+            message.tags.add(*tags)
+
+        with self.assertNumQueries(2):
+            response = MessageAPI.as_view()(request)
+
+        data = json.loads(response.content)
+        self.assertEqual(len(data['messages']), 25)
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_get_page(self, mock_dt):
+        contents = []
+        cursor = None
+        while True:
+            data = self._get_list({'limit': 2, 'cursor': cursor or ''})
+            self.assertLessEqual(len(data['messages']), 2)
+            contents.extend([m['content'] for m in data['messages']])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(contents, ['4', '3', '1', '2', 'This is a test.'])
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_get_filtered(self, mock_dt):
+        data = self._get_list({'level': Message.WARNING_LEVEL})
+        self.assertEqual([m['content'] for m in data['messages']], ['4'])
+
+        data = self._get_list({'tag': ['Seattle', 'Tacoma']})
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['4', '1', '2', 'This is a test.'])
+
+        data = self._get_list({'state': 'active'})
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['4', '3', '1'])
+
+        data = self._get_list({'state': 'scheduled'})
+        self.assertEqual([m['content'] for m in data['messages']], ['2'])
+
+        data = self._get_list({'state': 'expired'})
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['This is a test.'])
+
+        data = self._get_list({'modified_since': '2100-01-01T00:00:00Z'})
+        self.assertEqual(data['messages'], [])
+
     def test_get_one(self):
         url = reverse('message_api', kwargs={'message_id': '1'})
         request = self.factory.get(url)
@@ -109,6 +235,46 @@ class MessageAPITest(TestCase):
                          '2018-01-08T10:10:10+00:00')
         self.assertEqual(json_data['tags'], [])
 
+    def test_put_tags(self):
+        message = Message.objects.get(content='4')
+        url = reverse('message_api', kwargs={'message_id': message.pk})
+
+        def put(tags):
+            request = self.factory.put(url, data={'message': {'tags': tags}},
+                                       content_type='application/json')
+            request.user = self.user
+            with CaptureQueriesContext(connection) as context:
+                response = MessageAPI.as_view()(request, message_id=message.pk)
+            self.assertEqual(response.status_code, 200)
+            return [q['sql'] for q in context.captured_queries if (
+                'persistent_message_message_tags' in q['sql'] and
+                not q['sql'].startswith('SELECT'))]
+
+        # Only the changed tags are deleted and inserted
+        queries = put(['Tacoma', 'Olympia'])
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(queries[0].startswith('DELETE'))
+        self.assertTrue(queries[1].startswith('INSERT'))
+        self.assertEqual(sorted(t.name for t in message.tags.all()),
+                         ['Olympia', 'Tacoma'])
+
+        self.assertEqual(put(['Olympia', 'Tacoma']), [])
+
+        # Tag names are resolved without a query, until a tag changes
+        request = self.factory.put(url, data={'message': {'tags': ['Tacoma']}},
+                                   content_type='application/json')
+        request.user = self.user
+        tag_resolver.tag_ids()
+        with CaptureQueriesContext(connection) as context:
+            MessageAPI.as_view()(request, message_id=message.pk)
+        self.assertFalse(any('FROM "persistent_message_tag"' in q['sql'] and (
+            'message_tags' not in q['sql']) for q in context.captured_queries))
+
+        Tag.objects.create(name='Yakima', group=Tag.objects.get(
+            name='Tacoma').group)
+        self.assertEqual(len(put(['Yakima'])), 2)
+        self.assertEqual([t.name for t in message.tags.all()], ['Yakima'])
+
     @mock.patch('persistent_message.models.Message.current_datetime',
                 side_effect=mocked_current_datetime)
     def test_post(self, mock_dt):
@@ -136,6 +302,13 @@ class MessageAPITest(TestCase):
         data = json.loads(response.content)
         self.assertEqual(data, {})
 
+    def _get_list(self, params):
+        request = self.factory.get(reverse('messages_api'), params)
+        request.user = self.user
+        response = MessageAPI.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
     def _post(self, json_data):
         request = self.factory.post(
             reverse('messages_api'), data=json_data,
@@ -145,6 +318,177 @@ class MessageAPITest(TestCase):
         return response
 
 
+class ActiveMessageAPITest(TestCase):
+    fixtures = ['test.json']
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def setUp(self, mock_dt):
+        self.factory = RequestFactory()
+
+        message1 = Message(content='Hello {{ name }}!')
+        message1.save()
+        message1.tags.add(Tag.objects.get(name='Seattle'))
+
+        message2 = Message(content='2', level=Message.WARNING_LEVEL)
+        message2.expires = mocked_current_datetime() + timedelta(seconds=30)
+        message2.save()
+        commit_changes()
+
+    def _get(self, params={}, **headers):
+        request = self.factory.get(
+            reverse('active_messages_api'), params, headers=headers)
+        request.user = AnonymousUser()
+        return ActiveMessageAPI.as_view()(request)
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_get(self, mock_dt):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=30')
+        data = json.loads(response.content)
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['2', 'Hello !'])
+        self.assertEqual(data['messages'][1]['tags'], ['Seattle'])
+
+        response = self._get({'tag': 'Seattle'})
+        data = json.loads(response.content)
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['Hello !'])
+
+        response = self._get({'level': Message.WARNING_LEVEL})
+        data = json.loads(response.content)
+        self.assertEqual([m['content'] for m in data['messages']], ['2'])
+
+        response = self._get({'level': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_etag(self, mock_dt):
+        response = self._get({'tag': 'Seattle'})
+        etag = response['ETag']
+
+        response = self._get({'tag': 'Seattle'}, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self._get({'tag': 'Tacoma'}, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # A message change produces a new ETag
+        Message.objects.get(content='2').delete()
+        response = self._get({'tag': 'Seattle'}, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_locale(self, mock_dt):
+        message = Message.objects.get(content='2')
+        message.content = '{{ _("Monday") }}'
+        message.save()
+        commit_changes()
+
+        with translation.override('de'):
+            response = self._get({'level': Message.WARNING_LEVEL})
+            etag = response['ETag']
+            data = json.loads(response.content)
+            self.assertEqual(data['messages'][0]['content'], 'Montag')
+
+        # Other languages and time zones are not served the memoized payload
+        with translation.override('en'):
+            response = self._get({'level': Message.WARNING_LEVEL})
+            self.assertNotEqual(response['ETag'], etag)
+            data = json.loads(response.content)
+            self.assertEqual(data['messages'][0]['content'], 'Monday')
+
+        with translation.override('de'), timezone.override('Asia/Tokyo'):
+            response = self._get({'level': Message.WARNING_LEVEL},
+                                 if_none_match=etag)
+            self.assertEqual(response.status_code, 200)
+
+
+class AsyncActiveMessageAPITest(ActiveMessageAPITest):
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    async def test_async_get(self, mock_dt):
+        request = self.factory.get(
+            reverse('async_active_messages_api'), {'tag': 'Seattle'})
+        response = await AsyncActiveMessageAPI.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=30')
+        data = json.loads(response.content)
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['Hello !'])
+
+        request = self.factory.get(
+            reverse('async_active_messages_api'), {'tag': 'Seattle'},
+            headers={'if_none_match': response['ETag']})
+        response = await AsyncActiveMessageAPI.as_view()(request)
+        self.assertEqual(response.status_code, 304)
+
+        request = self.factory.get(
+            reverse('async_active_messages_api'), {'level': 'x'})
+        response = await AsyncActiveMessageAPI.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+
+
+class ActiveMessageStreamTest(ActiveMessageAPITest):
+    @override_settings(PERSISTENT_MESSAGE_STREAM_INTERVAL=0.01)
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    async def test_stream(self, mock_dt):
+        request = AsyncRequestFactory().get(
+            reverse('active_messages_stream'), {'tag': 'Seattle'})
+        response = await ActiveMessageStream.as_view()(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = response.streaming_content
+        event = await anext(events)
+        lines = event.decode('utf-8').split('\n')
+        self.assertRegex(lines[0], r'^id: "[0-9a-f]{40}"$')
+        self.assertEqual(lines[1], 'event: messages')
+        data = json.loads(lines[2][len('data: '):])
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['Hello !'])
+
+        # A change sends a new event
+        message = await Message.objects.aget(content='2')
+        await message.tags.aadd(await Tag.objects.aget(name='Seattle'))
+        await sync_to_async(commit_changes)()
+        event = await anext(events)
+        data = json.loads(event.decode('utf-8').split('\n')[2][6:])
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['2', 'Hello !'])
+        await events.aclose()
+
+    @override_settings(PERSISTENT_MESSAGE_STREAM_INTERVAL=0.01,
+                       PERSISTENT_MESSAGE_STREAM_LIFETIME=0.05)
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    async def test_stream_lifetime(self, mock_dt):
+        request = AsyncRequestFactory().get(reverse('active_messages_stream'))
+        response = await ActiveMessageStream.as_view()(request)
+
+        # The stream ends, and the client reconnects
+        events = [event async for event in response.streaming_content]
+        self.assertEqual(len(events), 1)
+
+    async def test_stream_errors(self):
+        request = AsyncRequestFactory().get(
+            reverse('active_messages_stream'), {'level': 'x'})
+        response = await ActiveMessageStream.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+
+        # Not served under WSGI
+        request = self.factory.get(reverse('active_messages_stream'))
+        response = await ActiveMessageStream.as_view()(request)
+        self.assertEqual(response.status_code, 501)
+
+
 class MessageAPIErrors(MessageAPITest):
     def test_no_access(self):
         request = self.factory.get(reverse('messages_api'))
@@ -188,6 +532,15 @@ class MessageAPIErrors(MessageAPITest):
         response = MessageAPI.as_view()(request, message_id=100)
         self.assertEqual(response.status_code, 404)
 
+    def test_get_list_errors(self):
+        for params in [{'limit': 0}, {'limit': 'x'}, {'level': 'x'},
+                       {'state': 'x'}, {'cursor': 'x'},
+                       {'modified_since': 'x'}]:
+            request = self.factory.get(reverse('messages_api'), params)
+            request.user = self.user
+            response = MessageAPI.as_view()(request)
+            self.assertEqual(response.status_code, 400)
+
     def test_post_data_errors(self):
         json_data = ''
         response = self._post(json_data)
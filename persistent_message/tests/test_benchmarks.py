@@ -0,0 +1,232 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Benchmarks for the message read and admin paths, skipped unless
+PERSISTENT_MESSAGE_BENCHMARK is set:
+
+    PERSISTENT_MESSAGE_BENCHMARK=1 python manage.py test \
+        persistent_message.tests.test_benchmarks
+
+Optional environment variables:
+
+    PERSISTENT_MESSAGE_BENCHMARK_SIZES: message counts, default
+        100,1000,10000
+    PERSISTENT_MESSAGE_BENCHMARK_ITERATIONS: timed runs per case, default 20
+    PERSISTENT_MESSAGE_BENCHMARK_OUTPUT: file for the JSON results
+
+Each result reports the query count, latency percentiles in milliseconds and
+peak traced memory in KiB, for one case at one message count. The benchmarks
+run in a transaction that is never committed, so seeded and written changes
+are published with commit_changes, as their commit would.
+"""
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from datetime import timedelta
+from persistent_message.models import Message, Tag, TagGroup
+from persistent_message.serializers import (
+    serialize_messages, dumps, MESSAGE_VALUES)
+from persistent_message.tests import mocked_current_datetime, commit_changes
+from persistent_message.views.api import MessageAPI, TagGroupAPI
+from unittest import mock, skipUnless
+import json
+import os
+import random
+import time
+import tracemalloc
+
+BENCHMARK = os.environ.get('PERSISTENT_MESSAGE_BENCHMARK')
+SIZES = [int(s) for s in os.environ.get(
+    'PERSISTENT_MESSAGE_BENCHMARK_SIZES', '100,1000,10000').split(',')]
+ITERATIONS = int(os.environ.get(
+    'PERSISTENT_MESSAGE_BENCHMARK_ITERATIONS', 20))
+OUTPUT = os.environ.get('PERSISTENT_MESSAGE_BENCHMARK_OUTPUT')
+
+TAG_GROUPS = {'Campus': 3, 'Role': 6, 'Department': 40}
+
+
+def seed_tags():
+    tags = []
+    for group_name, count in TAG_GROUPS.items():
+        group = TagGroup.objects.create(name=group_name)
+        tags.append(Tag.objects.bulk_create([Tag(
+            name='{}-{}'.format(group_name.lower(), i), group=group) for (
+                i) in range(count)]))
+    return tags
+
+
+def seed_messages(count, tags, seed=0):
+    """
+    Creates count messages: most expired, some active, a few scheduled,
+    each tagged with a campus, role and department drawn from skewed
+    distributions, or untagged.
+    """
+    rng = random.Random(seed)
+    now = mocked_current_datetime()
+    last_pk = Message.objects.order_by('pk').values_list(
+        'pk', flat=True).last() or 0
+
+    messages = []
+    for i in range(count):
+        state = rng.random()
+        if state < 0.8:
+            begins = now - timedelta(days=rng.randint(30, 1000))
+            expires = begins + timedelta(days=rng.randint(1, 29))
+        elif state < 0.95:
+            begins = now - timedelta(days=rng.randint(0, 30))
+            expires = None if rng.random() < 0.5 else (
+                now + timedelta(days=rng.randint(1, 30)))
+        else:
+            begins = now + timedelta(days=rng.randint(1, 30))
+            expires = begins + timedelta(days=rng.randint(1, 30))
+
+        messages.append(Message(
+            content='<p>Message {} for {{{{ name }}}}</p>'.format(i),
+            level=rng.choice(Message.LEVEL_CHOICES)[0],
+            begins=begins, expires=expires, modified_by='manager'))
+    Message.objects.bulk_create(messages, batch_size=1000)
+
+    Through = Message.tags.through
+    rows = []
+    for pk in Message.objects.filter(pk__gt=last_pk).values_list(
+            'pk', flat=True):
+        if rng.random() < 0.2:
+            continue
+        for group_tags in tags:
+            weights = [1 / (i + 1) for i in range(len(group_tags))]
+            tag = rng.choices(group_tags, weights=weights)[0]
+            rows.append(Through(message_id=pk, tag_id=tag.pk))
+    Through.objects.bulk_create(rows, batch_size=5000)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(int(round(p / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+@skipUnless(BENCHMARK, 'Set PERSISTENT_MESSAGE_BENCHMARK to run')
+@mock.patch('persistent_message.models.Message.current_datetime',
+            side_effect=mocked_current_datetime)
+class MessageBenchmark(TestCase):
+    results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        super(MessageBenchmark, cls).tearDownClass()
+        output = json.dumps(cls.results, indent=2)
+        if OUTPUT:
+            with open(OUTPUT, 'w') as f:
+                f.write(output)
+        else:
+            print('\n' + output)
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_superuser(
+            username='manager', password='')
+        self.tags = seed_tags()
+        self.user_tags = [group_tags[0].name for group_tags in self.tags]
+        commit_changes()
+
+    def measure(self, size, case, func):
+        """
+        Records the results of a case, and returns its query count.
+        """
+        func()  # Warm caches
+
+        latencies = []
+        queries = []
+        for i in range(ITERATIONS):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                func()
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context.captured_queries))
+
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.results.append({
+            'size': size,
+            'case': case,
+            'iterations': ITERATIONS,
+            'queries': max(queries),
+            'mean_ms': sum(latencies) / len(latencies),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'peak_memory_kb': peak / 1024,
+        })
+        return max(queries)
+
+    def request(self, view, method, url, data=None, **kwargs):
+        request = getattr(self.factory, method)(
+            url, data=data, content_type='application/json') if (
+                method in ('put', 'post')) else getattr(
+                    self.factory, method)(url, data)
+        request.user = self.user
+        response = view.as_view()(request, **kwargs)
+        self.assertLess(response.status_code, 300)
+        if method in ('put', 'post', 'delete'):
+            commit_changes()
+        return response
+
+    def test_benchmarks(self, mock_dt):
+        now = mocked_current_datetime()
+        previous = 0
+        for size in sorted(SIZES):
+            # Bulk creates send no signals, so the seeded messages are
+            # published here
+            seed_messages(size - previous, self.tags, seed=size)
+            commit_changes()
+            previous = size
+
+            message = Message.objects.active_messages().first()
+            messages_url = reverse('messages_api')
+            message_url = reverse('message_api', kwargs={
+                'message_id': message.pk})
+
+            self.measure(size, 'active_messages', lambda: list(
+                Message.objects.active_messages()))
+            self.measure(size, 'active_messages_tags', lambda: list(
+                Message.objects.active_messages(tags=self.user_tags)))
+            self.assertEqual(self.measure(
+                size, 'cached_active_messages', lambda: (
+                    Message.objects.cached_active_messages())), 0)
+            self.assertEqual(self.measure(
+                size, 'cached_active_messages_tags', lambda: (
+                    Message.objects.cached_active_messages(
+                        tags=self.user_tags))), 0)
+            self.assertEqual(
+                len(Message.objects.cached_active_messages()),
+                Message.objects.active_messages().count())
+            self.measure(size, 'render', lambda: message.render(
+                {'name': 'Jim'}))
+            self.measure(size, 'to_json', lambda: json.dumps([
+                m.to_json(now) for m in Message.objects.order_by(
+                    'pk').prefetch_related('tags__group')]))
+            self.measure(size, 'serialize_messages', lambda: dumps(list(
+                serialize_messages(Message.objects.order_by('pk').values(
+                    *MESSAGE_VALUES), now))))
+            self.measure(size, 'api_list', lambda: self.request(
+                MessageAPI, 'get', messages_url))
+            self.measure(size, 'api_list_page', lambda: self.request(
+                MessageAPI, 'get', messages_url, {'limit': 50}))
+            self.measure(size, 'api_get', lambda: self.request(
+                MessageAPI, 'get', message_url, message_id=message.pk))
+            self.measure(size, 'api_put', lambda: self.request(
+                MessageAPI, 'put', message_url, {'message': {
+                    'level': Message.WARNING_LEVEL,
+                    'tags': self.user_tags}}, message_id=message.pk))
+            self.measure(size, 'api_post', lambda: self.request(
+                MessageAPI, 'post', messages_url, {'message': {
+                    'content': 'New message', 'tags': self.user_tags}}))
+            self.measure(size, 'tag_groups_api', lambda: self.request(
+                TagGroupAPI, 'get', reverse('tag_groups_api')))
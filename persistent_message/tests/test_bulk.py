@@ -0,0 +1,173 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+from io import StringIO
+from persistent_message.bulk import (
+    parse_messages, import_messages, export_messages)
+from persistent_message.cache import tag_resolver
+from persistent_message.models import Message
+from persistent_message.tests import commit_changes
+from persistent_message.serializers import dumps
+from persistent_message.views.api import MessageImportAPI, MessageExportAPI
+from tempfile import NamedTemporaryFile
+import json
+
+
+class ImportMessagesTest(TestCase):
+    fixtures = ['test.json']
+
+    def test_parse_messages(self):
+        self.assertEqual(parse_messages('[{"content": "a"}]'),
+                         [{'content': 'a'}])
+        self.assertEqual(parse_messages('{"messages": [{"content": "a"}]}'),
+                         [{'content': 'a'}])
+        self.assertEqual(parse_messages('{"content": "a"}\n\n{"level": 30}'),
+                         [{'content': 'a'}, {'level': 30}])
+        self.assertEqual(parse_messages('{"content": "a"}'),
+                         [{'content': 'a'}])
+        self.assertRaises(ValidationError, parse_messages, '{"a": ')
+        self.assertRaises(ValidationError, parse_messages, '"a"')
+
+    def test_import_messages(self):
+        items = [
+            {'content': '<script></script>One', 'tags': ['Seattle']},
+            {'content': 'Two', 'level': Message.WARNING_LEVEL,
+             'tags': ['Seattle', 'Tacoma']},
+            {'content': 'Three'},
+        ]
+
+        # Tag names, then messages and message tags
+        commit_changes()
+        tag_resolver.clear()
+        with self.assertNumQueries(5):
+            messages, errors = import_messages(items, modified_by='manager')
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(messages), 3)
+        message = Message.objects.get(pk=messages[0].pk)
+        self.assertEqual(message.content, 'One')
+        self.assertEqual(message.modified_by, 'manager')
+        self.assertIsNotNone(message.begins)
+        self.assertEqual([t.name for t in message.tags.all()], ['Seattle'])
+        self.assertEqual(Message.objects.get(pk=messages[1].pk).tags.count(),
+                         2)
+
+    def test_import_messages_errors(self):
+        items = [
+            {'content': 'One'},
+            {'content': 'Two', 'tags': ['Bothell']},
+            {'content': 'Three', 'level': 1},
+            {'content': 'Four', 'begins': '2018-01-02T00:00:00Z',
+             'expires': '2018-01-01T00:00:00Z'},
+            {'content': 'Five', 'begins': 'x'},
+            {},
+        ]
+        messages, errors = import_messages(items)
+        self.assertEqual(messages, [])
+        self.assertEqual([e['index'] for e in errors], [1, 2, 3, 4, 5])
+        self.assertEqual(errors[0]['error'], 'Invalid tag: Bothell')
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_api(self):
+        request = RequestFactory().post(
+            reverse('messages_import_api'),
+            data='{"content": "One", "tags": ["Seattle"]}\n{"content": "Two"}',
+            content_type='application/x-ndjson')
+        request.user = User.objects.get(username='manager')
+        response = MessageImportAPI.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([m['content'] for m in data['messages']],
+                         ['One', 'Two'])
+        self.assertEqual(data['messages'][0]['tags'],
+                         [{'group': 'Cities', 'id': 3, 'name': 'Seattle'}])
+        self.assertEqual(data['messages'][0]['modified_by'], 'manager')
+
+        request = RequestFactory().post(
+            reverse('messages_import_api'),
+            data=[{'content': 'One'}, {'content': 'Two', 'tags': ['x']}],
+            content_type='application/json')
+        request.user = User.objects.get(username='manager')
+        response = MessageImportAPI.as_view()(request)
+
+        self.assertEqual(response.status_code, 400)
+        data = json.loads(response.content)
+        self.assertEqual(data['errors'],
+                         [{'index': 1, 'error': 'Invalid tag: x'}])
+
+    def test_command(self):
+        with NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump([{'content': 'One'}, {'content': 'Two'}], f)
+            f.flush()
+
+            out = StringIO()
+            call_command('import_messages', f.name, stdout=out)
+            self.assertIn('Imported 2 messages', out.getvalue())
+            self.assertEqual(Message.objects.count(), 3)
+
+        with NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump([{'content': 'One', 'tags': ['x']}], f)
+            f.flush()
+
+            self.assertRaises(CommandError, call_command, 'import_messages',
+                              f.name, stderr=StringIO())
+            self.assertEqual(Message.objects.count(), 3)
+
+
+class ExportMessagesTest(TestCase):
+    fixtures = ['test.json']
+
+    def setUp(self):
+        import_messages([{'content': str(i), 'tags': ['Seattle']} for (
+            i) in range(5)])
+
+    def test_export_messages(self):
+        # Messages, then tags with tag groups per chunk
+        with self.assertNumQueries(4):
+            messages = list(export_messages(chunk_size=2))
+
+        self.assertEqual([m['content'] for m in messages],
+                         ['This is a test.', '0', '1', '2', '3', '4'])
+        self.assertEqual(json.loads(dumps(messages[1])),
+                         Message.objects.get(content='0').to_json())
+
+    def test_api(self):
+        request = RequestFactory().get(reverse('messages_export_api'))
+        request.user = User.objects.get(username='manager')
+        response = MessageExportAPI.as_view()(request)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['content'] for line in lines],
+                         ['This is a test.', '0', '1', '2', '3', '4'])
+
+        request = RequestFactory().get(
+            reverse('messages_export_api'), {'format': 'json'})
+        request.user = User.objects.get(username='manager')
+        response = MessageExportAPI.as_view()(request)
+
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data), 6)
+
+        request = RequestFactory().get(
+            reverse('messages_export_api'), {'format': 'csv'})
+        request.user = User.objects.get(username='manager')
+        response = MessageExportAPI.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_messages', '--format=json', stdout=out)
+        self.assertEqual(len(json.loads(out.getvalue())), 6)
+
+        Message.objects.all().delete()
+        out = StringIO()
+        call_command('export_messages', '--format=json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue()), [])
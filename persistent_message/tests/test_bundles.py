@@ -0,0 +1,153 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.test import TestCase, override_settings
+from django.utils import translation
+from datetime import timedelta
+from persistent_message.bundles import (
+    get_bundle, get_audiences, add_audience, rebuild_bundles,
+    pop_bundles_dirty, audience, bundle_key)
+from persistent_message.cache import active_message_cache, get_cache
+from persistent_message.models import Message, Tag
+from persistent_message.tests import mocked_current_datetime, commit_changes
+from unittest import mock
+import time
+
+
+@mock.patch('persistent_message.models.Message.current_datetime',
+            side_effect=mocked_current_datetime)
+class MessageBundleTest(TestCase):
+    fixtures = ['test.json']
+
+    def setUp(self):
+        get_cache().clear()
+        active_message_cache.clear()
+
+        self.now = mocked_current_datetime()
+        self.seattle = Tag.objects.get(name='Seattle')
+        self.message1 = Message.objects.create(
+            content='<p>Hello {{ name }}</p>', begins=self.now,
+            expires=self.now + timedelta(days=1))
+        self.message1.tags.add(self.seattle)
+        self.message2 = Message.objects.create(
+            content='<p>All</p>', level=Message.WARNING_LEVEL,
+            begins=self.now)
+        self.message3 = Message.objects.create(
+            content='<p>Tacoma</p>', begins=self.now)
+        self.message3.tags.add(Tag.objects.get(name='Tacoma'))
+        commit_changes()
+
+    def test_get_bundle(self, mock_dt):
+        bundle = get_bundle(['Seattle'])
+        self.assertEqual(bundle['valid_until'], self.message1.expires)
+        self.assertEqual(bundle['messages'], [{
+            'id': self.message1.pk,
+            'level': Message.INFO_LEVEL,
+            'level_name': 'Info',
+            'tags': ['Seattle'],
+            'html': '<p>Hello </p>',
+        }])
+        self.assertEqual(get_audiences(), [audience(['Seattle'])])
+
+        # Known audiences are read from the cache
+        with self.assertNumQueries(0):
+            with mock.patch('persistent_message.bundles.build_bundle') as m:
+                self.assertEqual(get_bundle(['Seattle', 'Seattle']), bundle)
+                self.assertFalse(m.called)
+
+        bundle = get_bundle([], level=Message.WARNING_LEVEL)
+        self.assertEqual([m['id'] for m in bundle['messages']],
+                         [self.message2.pk])
+
+    def test_audience_hits(self, mock_dt):
+        get_bundle(['Seattle'])
+
+        # Audiences served from the cache are recorded again
+        with mock.patch('persistent_message.bundles.add_audience') as m:
+            get_bundle(['Seattle'])
+            self.assertFalse(m.called)
+
+            with mock.patch('persistent_message.bundles.time.monotonic',
+                            return_value=time.monotonic() + 8641):
+                get_bundle(['Seattle'])
+            m.assert_called_once_with(audience(['Seattle']))
+
+    @override_settings(PERSISTENT_MESSAGE_BUNDLE_MAX_AUDIENCES=2)
+    def test_add_audience(self, mock_dt):
+        add_audience(audience(['Seattle']))
+        add_audience(audience(['Tacoma']))
+        add_audience(audience(['Seattle']))
+        self.assertEqual(get_audiences(), [
+            audience(['Seattle']), audience(['Tacoma'])])
+
+        # The least recently recorded audience is replaced
+        add_audience(audience(['Bothell']))
+        self.assertEqual(get_audiences(), [
+            audience(['Bothell']), audience(['Seattle'])])
+
+    def test_bundle_locale(self, mock_dt):
+        self.message1.content = '{{ _("Monday") }}'
+        self.message1.save()
+        commit_changes()
+
+        with translation.override('de'):
+            self.assertEqual(get_bundle(['Seattle'])['messages'][0]['html'],
+                             'Montag')
+        with translation.override('en'):
+            self.assertEqual(get_bundle(['Seattle'])['messages'][0]['html'],
+                             'Monday')
+
+        # Audiences are rebuilt in their own language
+        self.assertEqual(rebuild_bundles(), 2)
+        with translation.override('de'):
+            self.assertEqual(get_bundle(['Seattle'])['messages'][0]['html'],
+                             'Montag')
+
+    def test_bundle_boundary(self, mock_dt):
+        get_bundle(['Seattle', 'Tacoma'])
+
+        later = self.message1.expires + timedelta(seconds=1)
+        bundle = get_bundle(['Seattle', 'Tacoma'], now=later)
+        self.assertIsNone(bundle['valid_until'])
+        self.assertEqual([m['id'] for m in bundle['messages']],
+                         [self.message3.pk])
+
+    def test_pending_changes(self, mock_dt):
+        message = Message.objects.create(content='New', begins=self.now)
+        message.tags.add(self.seattle)
+
+        cache = get_cache()
+        with mock.patch.object(cache, 'set', wraps=cache.set) as m:
+            bundle = get_bundle(['Seattle'])
+        self.assertFalse([c for c in m.call_args_list if c.args[0].startswith(
+            'persistent_message.bundle.')])
+        self.assertEqual([m['id'] for m in bundle['messages']],
+                         [self.message1.pk, message.pk])
+        self.assertEqual(get_audiences(), [])
+
+    def test_rebuild_bundles(self, mock_dt):
+        self.assertEqual(rebuild_bundles(), 0)
+        get_bundle(['Tacoma'])
+
+        message = Message.objects.create(content='New', begins=self.now)
+        message.tags.add(Tag.objects.get(name='Tacoma'))
+        commit_changes()
+
+        self.assertEqual(rebuild_bundles(), 1)
+        key = bundle_key(active_message_cache.active_set().version,
+                         audience(['Tacoma']))
+        self.assertEqual([m['id'] for m in get_cache().get(key)['messages']],
+                         [self.message3.pk, message.pk])
+
+    def test_dirty_on_commit(self, mock_dt):
+        pop_bundles_dirty()
+        with mock.patch('persistent_message.bundles.build_bundle') as m:
+            with self.captureOnCommitCallbacks(execute=True):
+                message = Message.objects.create(content='New')
+                message.tags.add(self.seattle)
+                self.assertFalse(pop_bundles_dirty())
+
+            # Bundles are left for the scheduler to rebuild
+            self.assertFalse(m.called)
+        self.assertTrue(pop_bundles_dirty())
+        self.assertFalse(pop_bundles_dirty())
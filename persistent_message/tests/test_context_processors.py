@@ -0,0 +1,67 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.test import TestCase, RequestFactory, override_settings
+from persistent_message.context_processors import (
+    persistent_messages, get_request_messages)
+from persistent_message.middleware import PersistentMessageMiddleware
+from persistent_message.models import Message, Tag
+from persistent_message.tests import mocked_current_datetime
+from unittest import mock
+
+
+def request_tags(request):
+    return request.GET.getlist('tag')
+
+
+def request_context(request):
+    return {'name': request.GET.get('name')}
+
+
+@mock.patch('persistent_message.models.Message.current_datetime',
+            side_effect=mocked_current_datetime)
+@override_settings(
+    PERSISTENT_MESSAGE_TAGS_MODULE=(
+        'persistent_message.tests.test_context_processors.request_tags'),
+    PERSISTENT_MESSAGE_CONTEXT_MODULE=(
+        'persistent_message.tests.test_context_processors.request_context'))
+class PersistentMessagesTest(TestCase):
+    fixtures = ['test.json']
+
+    def setUp(self):
+        with mock.patch('persistent_message.models.Message.current_datetime',
+                        side_effect=mocked_current_datetime):
+            message = Message(content='Hello {{ name }}!')
+            message.save()
+            message.tags.add(Tag.objects.get(name='Seattle'))
+            Message(content='Everyone').save()
+
+        self.factory = RequestFactory()
+
+    def test_context_processor(self, mock_dt):
+        request = self.factory.get('/', {'tag': 'Seattle', 'name': 'Jim'})
+        context = persistent_messages(request)
+
+        # Nothing is resolved until first access
+        with self.assertNumQueries(0):
+            accessor = context['persistent_messages']
+            self.assertIs(accessor, get_request_messages(request))
+
+        self.assertEqual([html for m, html in accessor], ['Hello Jim!'])
+        self.assertTrue(accessor)
+        self.assertEqual(len(accessor), 1)
+
+        with mock.patch('persistent_message.context_processors.'
+                        'render_messages') as mock_render:
+            list(persistent_messages(request)['persistent_messages'])
+            self.assertFalse(mock_render.called)
+
+    def test_middleware(self, mock_dt):
+        request = self.factory.get('/')
+        middleware = PersistentMessageMiddleware(lambda request: request)
+        self.assertIs(middleware(request), request)
+
+        self.assertEqual([html for m, html in request.persistent_messages],
+                         ['Hello None!', 'Everyone'])
+        self.assertIs(request.persistent_messages,
+                      persistent_messages(request)['persistent_messages'])
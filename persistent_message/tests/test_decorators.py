@@ -0,0 +1,63 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.contrib.auth.models import User
+from django.test import TestCase, RequestFactory, override_settings
+from persistent_message.decorators import (
+    get_auth_func, is_authorized, is_message_admin, SESSION_KEY)
+from unittest import mock
+
+auth_calls = []
+
+
+def is_test_admin(request):
+    auth_calls.append(request)
+    return request.user.username == 'manager'
+
+
+class MessageAdminRequiredTest(TestCase):
+    fixtures = ['test.json']
+
+    def setUp(self):
+        auth_calls.clear()
+        self.request = RequestFactory().get('/')
+        self.request.user = User.objects.get(username='manager')
+
+    def test_default_auth_func(self):
+        self.assertIs(get_auth_func(), is_message_admin)
+        self.assertIs(get_auth_func(), is_message_admin)
+        self.assertTrue(is_authorized(self.request))
+
+    @override_settings(PERSISTENT_MESSAGE_AUTH_MODULE=(
+        'persistent_message.tests.test_decorators.is_test_admin'))
+    def test_auth_func_setting(self):
+        self.assertIs(get_auth_func(), is_test_admin)
+        with mock.patch('persistent_message.decorators.import_string') as m:
+            get_auth_func()
+            self.assertFalse(m.called)
+
+    @override_settings(
+        PERSISTENT_MESSAGE_AUTH_MODULE=(
+            'persistent_message.tests.test_decorators.is_test_admin'),
+        PERSISTENT_MESSAGE_AUTH_CACHE_TIMEOUT=60)
+    def test_session_cache(self):
+        # No session, no caching
+        self.assertTrue(is_authorized(self.request))
+        self.assertTrue(is_authorized(self.request))
+        self.assertEqual(len(auth_calls), 2)
+
+        self.request.session = {}
+        self.assertTrue(is_authorized(self.request))
+        self.assertTrue(is_authorized(self.request))
+        self.assertEqual(len(auth_calls), 3)
+
+        # A different user in the same session
+        self.request.user = User.objects.create_user(username='nobody')
+        self.assertFalse(is_authorized(self.request))
+        self.assertFalse(is_authorized(self.request))
+        self.assertEqual(len(auth_calls), 4)
+
+        # An expired decision
+        self.request.session[SESSION_KEY][2] = 0
+        self.assertFalse(is_authorized(self.request))
+        self.assertEqual(len(auth_calls), 5)
@@ -0,0 +1,146 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.contrib.auth.models import User
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from persistent_message.cache import active_message_cache, sanitize_cache
+from persistent_message.metrics import (
+    get_sinks, instrument, registry, metric_recorded, RegistrySink,
+    SignalSink, DURATION, QUERIES, PAYLOAD_SIZE, CACHE)
+from persistent_message.models import Message
+from persistent_message.tests import commit_changes
+from persistent_message.views import metrics
+from persistent_message.views.api import TagGroupAPI
+from unittest import mock
+
+REGISTRY_SINK = 'persistent_message.metrics.RegistrySink'
+
+
+class MetricsTest(TestCase):
+    fixtures = ['test.json']
+
+    def setUp(self):
+        commit_changes()
+        registry.clear()
+        active_message_cache.clear()
+        sanitize_cache.clear()
+
+    def test_no_sinks(self):
+        self.assertEqual(get_sinks(), ())
+        with mock.patch('persistent_message.metrics.observe') as observe:
+            Message.objects.cached_active_messages()
+            Message(content='<p>{{ name }}</p>').render({'name': 'Jim'})
+            self.assertFalse(observe.called)
+
+    @override_settings(PERSISTENT_MESSAGE_METRICS_SINKS=[REGISTRY_SINK])
+    def test_registry_sink(self):
+        self.assertIsInstance(get_sinks()[0], RegistrySink)
+
+        Message.objects.cached_active_messages()
+        Message.objects.cached_active_messages()
+        self.assertEqual(registry.summary(
+            DURATION, operation='cached_active_messages')[0], 2)
+        self.assertEqual(registry.summary(
+            QUERIES, operation='cached_active_messages'), (2, 1))
+        self.assertEqual(registry.counter(
+            CACHE, cache='active_messages', result='miss'), 1)
+        self.assertEqual(registry.counter(
+            CACHE, cache='active_messages', result='hit'), 1)
+
+        html = Message(content='<p>{{ name }}</p>').render({'name': 'Jim'})
+        self.assertEqual(registry.summary(
+            PAYLOAD_SIZE, operation='render'), (1, len(html)))
+
+    @override_settings(PERSISTENT_MESSAGE_METRICS_SINKS=[REGISTRY_SINK])
+    def test_active_messages(self):
+        # Lazy querysets are measured when they are evaluated
+        queryset = Message.objects.active_messages().filter(level__gt=0)
+        self.assertEqual(registry.summary(
+            QUERIES, operation='active_messages'), (0, 0))
+
+        list(queryset)
+        list(queryset)
+        self.assertEqual(registry.summary(
+            QUERIES, operation='active_messages'), (1, 1))
+        self.assertGreater(registry.summary(
+            DURATION, operation='active_messages')[1], 0)
+
+        list(Message.objects.all())
+        self.assertEqual(registry.summary(
+            QUERIES, operation='active_messages'), (1, 1))
+
+    @override_settings(PERSISTENT_MESSAGE_METRICS_SINKS=[REGISTRY_SINK])
+    def test_sanitize_content(self):
+        Message.sanitize_content('<p>Hello</p>')
+        Message.sanitize_content('<p>Hello</p>')
+        self.assertEqual(registry.summary(
+            DURATION, operation='sanitize_content')[0], 2)
+        self.assertEqual(registry.counter(
+            CACHE, cache='sanitize', result='hit'), 1)
+
+    @override_settings(PERSISTENT_MESSAGE_METRICS_SINKS=[
+        'persistent_message.metrics.SignalSink'])
+    def test_signal_sink(self):
+        received = []
+
+        def handler(sender, name, value, kind, labels, **kwargs):
+            received.append((name, value, kind, labels))
+
+        @instrument('test', size=len)
+        def func():
+            return 'abc'
+
+        metric_recorded.connect(handler, sender=SignalSink)
+        try:
+            self.assertEqual(func(), 'abc')
+        finally:
+            metric_recorded.disconnect(handler, sender=SignalSink)
+
+        self.assertEqual([r[0] for r in received],
+                         [DURATION, QUERIES, PAYLOAD_SIZE])
+        self.assertEqual(received[1], (
+            QUERIES, 0, 'summary', {'operation': 'test'}))
+        self.assertEqual(received[2][1], 3)
+
+    @override_settings(PERSISTENT_MESSAGE_METRICS_SINKS=[
+        'persistent_message.metrics.LoggingSink'])
+    def test_logging_sink(self):
+        with self.assertLogs('persistent_message.metrics') as logs:
+            Message.sanitize_content('<p>Hello</p>')
+        self.assertIn(
+            'INFO:persistent_message.metrics:{} operation=sanitize_content'
+            ' 0'.format(QUERIES), logs.output)
+
+    @override_settings(PERSISTENT_MESSAGE_METRICS_SINKS=[REGISTRY_SINK])
+    def test_api_view(self):
+        request = RequestFactory().get(reverse('tag_groups_api'))
+        request.user = User.objects.get(username='manager')
+        response = TagGroupAPI.as_view()(request)
+
+        self.assertEqual(registry.summary(
+            PAYLOAD_SIZE, operation='tag_group_api.get'), (
+                1, len(response.content)))
+        self.assertEqual(registry.summary(
+            QUERIES, operation='tag_group_api.get')[0], 1)
+
+    @override_settings(PERSISTENT_MESSAGE_METRICS_SINKS=[REGISTRY_SINK],
+                       INTERNAL_IPS=['127.0.0.1'])
+    def test_metrics_view(self):
+        registry.increment(CACHE, 2, {'cache': 'render', 'result': 'hit'})
+        registry.observe(DURATION, 0.5, {'operation': 'render'})
+
+        response = metrics(RequestFactory().get(
+            reverse('persistent_message_metrics')))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode('utf-8').splitlines(), [
+            '# TYPE {} counter'.format(CACHE),
+            '{}{{cache="render",result="hit"}} 2'.format(CACHE),
+            '# TYPE {} summary'.format(DURATION),
+            '{}_count{{operation="render"}} 1'.format(DURATION),
+            '{}_sum{{operation="render"}} 0.5'.format(DURATION),
+        ])
+
+        response = metrics(RequestFactory().get(
+            reverse('persistent_message_metrics'), REMOTE_ADDR='10.0.0.1'))
+        self.assertEqual(response.status_code, 403)
@@ -1,12 +1,15 @@
 # Copyright 2025 UW-IT, University of Washington
 # SPDX-License-Identifier: Apache-2.0
 
-from django.test import TestCase
-from django.utils import timezone
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone, translation
 from datetime import timedelta
-from persistent_message.models import Message, Tag, TagGroup
-from persistent_message.tests import mocked_current_datetime
-from unittest import mock
+from persistent_message.models import (
+    Message, Tag, TagGroup, render_messages, iter_render_messages)
+from persistent_message.cache import active_message_cache
+from persistent_message.tests import mocked_current_datetime, commit_changes
+from unittest import mock, skipUnless
 
 
 class PersistentMessageTestCase(TestCase):
@@ -119,6 +122,26 @@ class MessageTest(PersistentMessageTestCase):
         context = {'foo': 'this', 'bar': 'that'}
         self.assertEqual(self.message.render(context), 'Test this and that.')
 
+    def test_render_cached_template(self):
+        self.message.content = 'Test {{ foo }}.'
+        self.message.save()
+
+        template = self.message.get_template()
+        self.assertIs(self.message.get_template(), template)
+        self.assertIs(Message.objects.get(pk=self.message.pk).get_template(),
+                      template)
+        self.assertEqual(self.message.render({'foo': 'this'}), 'Test this.')
+
+        # Changed content is recompiled
+        self.message.content = 'Test {{ bar }}.'
+        self.assertIsNot(self.message.get_template(), template)
+        self.assertEqual(self.message.render({'bar': 'that'}), 'Test that.')
+
+        # Content without template tokens is not compiled
+        self.message.content = 'Hello World!'
+        self.assertIsNone(self.message.get_template())
+        self.assertEqual(self.message.render(), 'Hello World!')
+
     def test_sanitize_content(self):
         self.assertRaises(TypeError, self.message.sanitize_content, None)
         self.assertRaises(TypeError, self.message.sanitize_content, 1.75)
@@ -158,6 +181,123 @@ class MessageTest(PersistentMessageTestCase):
             self.message.sanitize_content('Hello<br/>World!'),
             'Hello<br>World!')
 
+    def test_sanitize_content_memoized(self):
+        content = '<p>Memoized <script>x</script></p>'
+        with mock.patch('persistent_message.models.nh3.clean',
+                        return_value='<p>Memoized </p>') as mock_clean:
+            self.assertEqual(self.message.sanitize_content(content),
+                             '<p>Memoized </p>')
+            self.assertEqual(self.message.sanitize_content(content),
+                             '<p>Memoized </p>')
+            self.assertEqual(mock_clean.call_count, 1)
+
+    def test_clean_unchanged_content(self):
+        self.message.content = '<p>Unchanged <b>content</b></p>'
+        self.message.save()
+
+        message = Message.objects.get(pk=self.message.pk)
+        with mock.patch.object(Message, 'sanitize_content') as mock_sanitize:
+            message.expires = message.begins + timedelta(days=1)
+            message.save()
+            self.message.save()
+            self.assertFalse(mock_sanitize.called)
+
+            message.content = '<p>Changed</p>'
+            mock_sanitize.return_value = '<p>Changed</p>'
+            message.save()
+            self.assertEqual(mock_sanitize.call_count, 1)
+
+    def test_context_keys(self):
+        self.message.content = 'Hello World!'
+        self.assertEqual(self.message.context_keys(), frozenset())
+
+        self.message.content = (
+            '{{ a }} {{ b.c|default:d }} {{ "e" }} {# f #} '
+            '{% comment %}{{ g }}{% endcomment %}')
+        self.assertEqual(self.message.context_keys(), {'a', 'b', 'd'})
+
+        self.message.content = '{% if a %}{{ b }}{% endif %}'
+        self.assertIsNone(self.message.context_keys())
+
+    async def test_arender(self):
+        self.message.content = 'Test {{ foo }}.'
+        self.assertEqual(await self.message.arender({'foo': 'this'}),
+                         'Test this.')
+
+        self.message.content = 'Hello World!'
+        self.assertEqual(await self.message.arender(), 'Hello World!')
+
+    def test_render_cached_html(self):
+        self.message.content = 'Test {{ foo }}.'
+        self.message.save()
+
+        with mock.patch('django.template.Template.render',
+                        return_value='Rendered') as mock_render:
+            self.assertEqual(self.message.render({'foo': 'a'}), 'Rendered')
+            self.assertEqual(self.message.render({'foo': 'a'}), 'Rendered')
+            self.assertEqual(self.message.render(
+                {'foo': 'a', 'bar': 'b'}), 'Rendered')
+            self.assertEqual(mock_render.call_count, 1)
+
+            # Different values, and values that are not cached
+            self.message.render({'foo': 'b'})
+            self.message.render({})
+            self.message.render({'foo': None})
+            self.message.render({'foo': object()})
+            self.message.render({'foo': object()})
+            self.assertEqual(mock_render.call_count, 6)
+
+        self.assertEqual(self.message.render({'foo': 'c'}), 'Test c.')
+        self.assertEqual(self.message.render({'foo': 'c'}), 'Test c.')
+
+    def test_render_cached_html_locale(self):
+        self.message.content = '{{ _("Monday") }} {{ foo }}'
+        self.message.save()
+
+        with translation.override('en'):
+            self.assertEqual(self.message.render({'foo': 'a'}), 'Monday a')
+        with translation.override('de'):
+            self.assertEqual(self.message.render({'foo': 'a'}), 'Montag a')
+
+        with timezone.override('America/Los_Angeles'):
+            key = self.message._render_cache_key(
+                self.message.context_keys(), {'foo': 'a'})
+        with timezone.override('UTC'):
+            self.assertNotEqual(key, self.message._render_cache_key(
+                self.message.context_keys(), {'foo': 'a'}))
+
+
+class RenderMessagesTest(PersistentMessageTestCase):
+    def setUp(self):
+        self.messages = [
+            Message(content='Hello {{ name }}!'),
+            Message(content='<p>No tokens</p>'),
+            Message(content='{% if name %}Bye {{ name }}.{% endif %}'),
+        ]
+
+    def test_render_messages(self):
+        results = render_messages(self.messages, {'name': 'Jim'})
+        self.assertEqual(results, [
+            (self.messages[0], 'Hello Jim!'),
+            (self.messages[1], '<p>No tokens</p>'),
+            (self.messages[2], 'Bye Jim.')])
+
+        results = render_messages(self.messages)
+        self.assertEqual([html for m, html in results],
+                         ['Hello !', '<p>No tokens</p>', ''])
+
+    def test_iter_render_messages(self):
+        results = iter_render_messages(self.messages, {'name': 'Jim'})
+        self.assertEqual(next(results), (self.messages[0], 'Hello Jim!'))
+        self.assertEqual([html for m, html in results],
+                         ['<p>No tokens</p>', 'Bye Jim.'])
+
+    def test_render_messages_isolated(self):
+        messages = [Message(content='{% now "Y" as year %}a'),
+                    Message(content='[{{ year }}]')]
+        results = render_messages(messages)
+        self.assertEqual([html for m, html in results], ['a', '[]'])
+
 
 class TagTest(PersistentMessageTestCase):
     def test_json(self):
@@ -207,6 +347,7 @@ class MessageManagerTest(PersistentMessageTestCase):
         message4 = Message(content='4', level=Message.WARNING_LEVEL)
         message4.save()
         message4.tags.add(tag1, tag2)
+        commit_changes()
 
     def test_all_messages(self):
         results = Message.objects.all()
@@ -225,3 +366,160 @@ class MessageManagerTest(PersistentMessageTestCase):
 
         results = Message.objects.active_messages(level=Message.WARNING_LEVEL)
         self.assertEqual([str(m) for m in results], ['4'])
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_cached_active_messages(self, mock_dt):
+        results = Message.objects.cached_active_messages()
+        self.assertEqual([str(m) for m in results], ['4', '1', '3'])
+
+        results = Message.objects.cached_active_messages(
+            tags=['Seattle', 'Tacoma'])
+        self.assertEqual([str(m) for m in results], ['4', '1'])
+
+        results = Message.objects.cached_active_messages(
+            level=Message.WARNING_LEVEL)
+        self.assertEqual([str(m) for m in results], ['4'])
+
+        # Cached reads need no queries
+        with self.assertNumQueries(0):
+            Message.objects.cached_active_messages(tags=['Seattle'])
+
+        # Saving a message invalidates the cache
+        message = Message.objects.get(content='3')
+        message.level = Message.DANGER_LEVEL
+        message.save()
+        results = Message.objects.cached_active_messages()
+        self.assertEqual([str(m) for m in results], ['3', '4', '1'])
+
+        # Changing tags invalidates the cache
+        message.tags.add(Tag.objects.get(name='Tacoma'))
+        results = Message.objects.cached_active_messages(tags=['Tacoma'])
+        self.assertEqual([str(m) for m in results], ['3', '4'])
+
+        # Uncommitted changes are not cached
+        self.assertEqual(len(Message.objects.cached_active_messages()), 3)
+        with self.assertNumQueries(2):
+            Message.objects.cached_active_messages()
+
+        commit_changes()
+        Message.objects.cached_active_messages()
+        with self.assertNumQueries(0):
+            Message.objects.cached_active_messages()
+
+    def test_cached_active_messages_boundary(self):
+        later = mocked_current_datetime() + timedelta(days=8)
+        with mock.patch(
+                'persistent_message.models.Message.current_datetime',
+                return_value=mocked_current_datetime()):
+            results = Message.objects.cached_active_messages()
+            self.assertEqual([str(m) for m in results], ['4', '1', '3'])
+
+        # Message 2 begins after 7 days
+        with mock.patch(
+                'persistent_message.models.Message.current_datetime',
+                return_value=later):
+            results = Message.objects.cached_active_messages()
+            self.assertEqual([str(m) for m in results], ['4', '2', '1', '3'])
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    async def test_aactive_messages(self, mock_dt):
+        results = await Message.objects.aactive_messages(
+            tags=['Seattle', 'Tacoma'])
+        self.assertEqual([str(m) for m in results], ['4', '1'])
+
+        # A cached read stays on the event loop
+        with mock.patch('persistent_message.cache.sync_to_async') as m:
+            results = await Message.objects.aactive_messages()
+            self.assertEqual([str(m) for m in results], ['4', '1', '3'])
+            self.assertFalse(m.called)
+
+    def test_message_timeline(self):
+        timeline = active_message_cache._build(
+            'test', mocked_current_datetime())
+        self.assertEqual(len(timeline.boundaries), 2)
+
+        # Crossing a boundary needs no queries
+        with self.assertNumQueries(0):
+            active_set = timeline.active_set(mocked_current_datetime())
+            self.assertEqual(
+                [str(m) for m in active_set.messages], ['4', '1', '3'])
+            self.assertEqual(active_set.begins, mocked_current_datetime())
+            self.assertEqual(active_set.expires,
+                             mocked_current_datetime() + timedelta(days=7))
+
+            active_set = timeline.active_set(
+                mocked_current_datetime() + timedelta(days=7))
+            self.assertEqual(
+                [str(m) for m in active_set.messages], ['4', '2', '1', '3'])
+            self.assertEqual(active_set.expires, None)
+
+            active_set = timeline.active_set(
+                mocked_current_datetime() - timedelta(days=1))
+            self.assertEqual(active_set.messages, [])
+
+        # Active sets are computed once per interval
+        self.assertIs(timeline.active_set(mocked_current_datetime()),
+                      timeline.active_set(
+                          mocked_current_datetime() + timedelta(days=1)))
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_active_set_filter(self, mock_dt):
+        active_set = active_message_cache.active_set()
+        self.assertEqual(
+            [str(m) for m in active_set.filter(tags=['Tacoma'])], ['4'])
+        self.assertEqual(
+            [str(m) for m in active_set.filter(
+                tags=['Seattle', 'Tacoma', 'Spokane'])], ['4', '1'])
+        self.assertEqual(
+            [str(m) for m in active_set.filter(
+                level=Message.INFO_LEVEL, tags=['Seattle', 'Tacoma'])],
+            ['1'])
+        self.assertEqual(
+            [str(m) for m in active_set.filter(
+                level=Message.DANGER_LEVEL)], [])
+        self.assertEqual(active_set.filter(tags=['Bothell']), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'Requires SQLite')
+    def test_active_messages_indexes(self):
+        plan = Message.objects.active_messages(
+            level=Message.WARNING_LEVEL).explain()
+        self.assertIn('USING INDEX pm_message_level_begins_idx', plan)
+
+        plan = Message.objects.active_messages().explain()
+        self.assertIn('USING INDEX pm_message_level_begins_idx', plan)
+
+        plan = Message.objects.active_messages(tags=['Seattle']).explain()
+        self.assertIn('USING COVERING INDEX pm_message_tags_tag_msg_idx', plan)
+
+
+class MessageRollbackTest(TransactionTestCase):
+    def test_rolled_back_message(self):
+        active_message_cache.clear()
+        Message.objects.cached_active_messages()
+
+        try:
+            with transaction.atomic():
+                Message(content='ghost').save()
+                results = Message.objects.cached_active_messages()
+                self.assertEqual([str(m) for m in results], ['ghost'])
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertEqual(Message.objects.count(), 0)
+        self.assertEqual(Message.objects.cached_active_messages(), [])
+
+    def test_committed_message(self):
+        active_message_cache.clear()
+        Message.objects.cached_active_messages()
+
+        with transaction.atomic():
+            Message(content='1').save()
+
+        results = Message.objects.cached_active_messages()
+        self.assertEqual([str(m) for m in results], ['1'])
+        with self.assertNumQueries(0):
+            Message.objects.cached_active_messages()
@@ -0,0 +1,73 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.test import TestCase, override_settings
+from persistent_message.cache import ActiveMessageCache
+from persistent_message.models import Message
+from persistent_message.notify import (
+    get_transport, CacheTransport, FileTransport)
+from persistent_message.tests import mocked_current_datetime
+from tempfile import TemporaryDirectory
+from unittest import mock
+import os
+
+
+class CacheTransportTest(TestCase):
+    def test_version(self):
+        worker1 = CacheTransport(interval=1)
+        worker2 = CacheTransport(interval=1)
+        self.assertEqual(worker1.version(), worker2.version())
+
+        worker1.publish('v1')
+        self.assertEqual(worker1.version(), 'v1')
+
+        # Other processes read the cache once per interval
+        self.assertNotEqual(worker2.version(), 'v1')
+        with mock.patch('persistent_message.notify.time.monotonic',
+                        return_value=worker2._next_poll):
+            self.assertEqual(worker2.version(), 'v1')
+
+    @override_settings(
+        PERSISTENT_MESSAGE_NOTIFY_OPTIONS={'interval': 5})
+    def test_get_transport(self):
+        transport = get_transport()
+        self.assertIsInstance(transport, CacheTransport)
+        self.assertEqual(transport.interval, 5)
+        self.assertIs(get_transport(), transport)
+
+
+class FileTransportTest(TestCase):
+    fixtures = ['test.json']
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, 'version')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_version(self):
+        worker1 = FileTransport(path=self.path)
+        worker2 = FileTransport(path=self.path)
+        self.assertEqual(worker1.version(), worker2.version())
+
+        worker1.publish('v1')
+        self.assertEqual(worker1.version(), 'v1')
+        self.assertEqual(worker2.version(), 'v1')
+
+        worker2.publish('v2')
+        self.assertEqual(worker1.version(), 'v2')
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def test_invalidation(self, mock_dt):
+        with override_settings(
+                PERSISTENT_MESSAGE_NOTIFY_TRANSPORT=(
+                    'persistent_message.notify.FileTransport'),
+                PERSISTENT_MESSAGE_NOTIFY_OPTIONS={'path': self.path}):
+            worker = ActiveMessageCache()
+            self.assertEqual(worker.active_messages(), [])
+
+            Message(content='1').save()
+            self.assertEqual(
+                [str(m) for m in worker.active_messages()], ['1'])
@@ -0,0 +1,112 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.core.management import call_command
+from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from persistent_message.bundles import (
+    get_bundle, mark_bundles_dirty, pop_bundles_dirty)
+from persistent_message.cache import active_message_cache, get_cache
+from persistent_message.models import Message, Tag
+from persistent_message.scheduler import MessageScheduler
+from persistent_message.tests import mocked_current_datetime, commit_changes
+from unittest import mock
+
+
+@mock.patch('persistent_message.models.Message.current_datetime',
+            side_effect=mocked_current_datetime)
+class MessageSchedulerTest(TestCase):
+    fixtures = ['test.json']
+
+    def setUp(self):
+        get_cache().clear()
+        active_message_cache.clear()
+
+        self.now = mocked_current_datetime()
+        self.boundary = self.now + timedelta(seconds=100)
+        self.current = Message.objects.create(
+            content='Current', begins=self.now, expires=self.boundary)
+        self.scheduled = Message.objects.create(
+            content='Scheduled', begins=self.boundary)
+        for message in (self.current, self.scheduled):
+            message.tags.add(Tag.objects.get(name='Seattle'))
+        commit_changes()
+
+    def test_run_pending(self, mock_dt):
+        get_bundle(['Seattle'])
+        scheduler = MessageScheduler(lead=30, interval=60)
+
+        # Not yet within the lead time
+        with mock.patch(
+                'persistent_message.scheduler.rebuild_bundles') as m:
+            self.assertEqual(scheduler.run_pending(), 60)
+            self.assertEqual(scheduler.run_pending(
+                self.now + timedelta(seconds=50)), 20)
+            self.assertFalse(m.called)
+
+        soon = self.boundary - timedelta(seconds=10)
+        self.assertEqual(scheduler.run_pending(soon), 10)
+
+        # Readers switch to the prepared bundle at the boundary
+        with mock.patch('persistent_message.bundles.build_bundle') as m:
+            bundle = get_bundle(['Seattle'], now=self.boundary)
+            self.assertFalse(m.called)
+        self.assertIsNone(bundle['valid_until'])
+        self.assertEqual([m['id'] for m in bundle['messages']],
+                         [self.scheduled.pk])
+
+        # A boundary is prepared once per message version
+        with mock.patch(
+                'persistent_message.scheduler.rebuild_bundles') as m:
+            scheduler.run_pending(soon)
+            self.assertFalse(m.called)
+
+            self.scheduled.level = Message.WARNING_LEVEL
+            self.scheduled.save()
+            commit_changes()
+            scheduler.run_pending(soon)
+            self.assertTrue(m.called)
+
+        # No upcoming boundary
+        self.assertEqual(scheduler.run_pending(self.boundary), 60)
+
+    def test_dirty_bundles(self, mock_dt):
+        get_bundle(['Seattle'])
+        scheduler = MessageScheduler(lead=30, interval=60)
+        pop_bundles_dirty()
+
+        with mock.patch(
+                'persistent_message.scheduler.rebuild_bundles') as m:
+            scheduler.run_pending()
+            self.assertFalse(m.called)
+
+            mark_bundles_dirty()
+            scheduler.run_pending()
+            m.assert_called_once_with(mocked_current_datetime(),
+                                      prepare_next=False)
+            scheduler.run_pending()
+            self.assertEqual(m.call_count, 1)
+
+    def test_run(self, mock_dt):
+        scheduler = MessageScheduler(interval=5)
+        run_pending = mock.patch.object(
+            scheduler, 'run_pending', side_effect=[ValueError(), 1])
+        sleep = mock.patch('persistent_message.scheduler.time.sleep',
+                           side_effect=[None, StopIteration()])
+        close = mock.patch(
+            'persistent_message.scheduler.close_old_connections')
+        with run_pending, sleep as sleep, close as close:
+            with self.assertLogs('persistent_message.scheduler') as logs:
+                self.assertRaises(StopIteration, scheduler.run)
+
+        self.assertEqual(close.call_count, 2)
+        self.assertEqual([c.args for c in sleep.call_args_list], [(5,), (1,)])
+        self.assertIn('Traceback', logs.output[0])
+
+    def test_command(self, mock_dt):
+        out = StringIO()
+        call_command('run_message_scheduler', '--once', '--lead', '10',
+                     stdout=out)
+        self.assertEqual(out.getvalue().strip(),
+                         'Next run due in 10 seconds')
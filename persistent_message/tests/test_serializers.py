@@ -0,0 +1,46 @@
+# Copyright 2025 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+from django.test import TestCase
+from datetime import timedelta
+from persistent_message.models import Message, Tag
+from persistent_message.serializers import (
+    serialize_messages, dumps, MESSAGE_VALUES)
+from persistent_message.tests import mocked_current_datetime
+from unittest import mock
+import json
+
+
+class SerializeMessagesTest(TestCase):
+    fixtures = ['test.json']
+
+    @mock.patch('persistent_message.models.Message.current_datetime',
+                side_effect=mocked_current_datetime)
+    def setUp(self, mock_dt):
+        message = Message(content='1', level=Message.WARNING_LEVEL)
+        message.expires = mocked_current_datetime() + timedelta(days=7)
+        message.save()
+        message.tags.add(*Tag.objects.filter(name__in=['Seattle', 'Oregon']))
+
+        Message(content='2').save()
+
+    def _serialize(self):
+        now = mocked_current_datetime()
+        rows = Message.objects.order_by('pk').values(*MESSAGE_VALUES)
+        return json.loads(dumps(list(serialize_messages(rows, now))))
+
+    def test_serialize_messages(self):
+        now = mocked_current_datetime()
+        expected = [m.to_json(now) for m in Message.objects.order_by('pk')]
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self._serialize(), expected)
+
+        with mock.patch('persistent_message.serializers.orjson', None):
+            self.assertEqual(self._serialize(), expected)
+
+    def test_dumps(self):
+        with mock.patch('persistent_message.serializers.orjson', None):
+            self.assertEqual(dumps({'a': mocked_current_datetime()}),
+                             b'{"a": "2018-01-01T10:10:10+00:00"}')
+            self.assertRaises(TypeError, dumps, {'a': object()})
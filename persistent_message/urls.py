@@ -2,15 +2,28 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from django.urls import re_path
-from persistent_message.views import manage
-from persistent_message.views.api import MessageAPI, TagGroupAPI
+from persistent_message.views import manage, metrics
+from persistent_message.views.api import (
+    MessageAPI, MessageImportAPI, MessageExportAPI, TagGroupAPI,
+    ActiveMessageAPI, AsyncActiveMessageAPI, ActiveMessageStream)
 
 
 urlpatterns = [
     re_path(r'manage$', manage, name='manage_persistent_messages'),
+    re_path(r'metrics$', metrics, name='persistent_message_metrics'),
     re_path(r'api/v1/messages$', MessageAPI.as_view(), name='messages_api'),
     re_path(r'api/v1/messages/(?P<message_id>\d+)$', MessageAPI.as_view(),
             name='message_api'),
+    re_path(r'api/v1/messages/import$', MessageImportAPI.as_view(),
+            name='messages_import_api'),
+    re_path(r'api/v1/messages/export$', MessageExportAPI.as_view(),
+            name='messages_export_api'),
     re_path(r'api/v1/tag_groups$', TagGroupAPI.as_view(),
-            name='tag_groups_api')
+            name='tag_groups_api'),
+    re_path(r'api/v1/active_messages$', ActiveMessageAPI.as_view(),
+            name='active_messages_api'),
+    re_path(r'api/v1/active_messages/stream$', ActiveMessageStream.as_view(),
+            name='active_messages_stream'),
+    re_path(r'api/v1/active_messages/async$', AsyncActiveMessageAPI.as_view(),
+            name='async_active_messages_api'),
 ]
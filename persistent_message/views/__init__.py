@@ -3,6 +3,9 @@
 
 from persistent_message.decorators import message_admin_required
 from persistent_message.models import Message
+from persistent_message.metrics import registry
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.urls import reverse
 from django.shortcuts import render
 from django import template
@@ -15,6 +18,7 @@ def manage(request):
         'message_api': reverse('messages_api'),
         'tags_api': reverse('tag_groups_api'),
         'message_levels': Message.LEVEL_CHOICES,
+        'page_size': getattr(settings, 'PERSISTENT_MESSAGE_PAGE_SIZE', 50),
     }
 
     try:
@@ -24,3 +28,15 @@ def manage(request):
         context['wrapper_template'] = 'manage_wrapper.html'
 
     return render(request, 'manage.html', context)
+
+
+def metrics(request):
+    """
+    Exposes the in-memory metrics registry in the Prometheus text format,
+    to clients in INTERNAL_IPS only.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        return HttpResponseForbidden()
+
+    return HttpResponse(registry.exposition(),
+                        content_type='text/plain; version=0.0.4')
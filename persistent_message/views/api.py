@@ -1,22 +1,58 @@
 # Copyright 2025 UW-IT, University of Washington
 # SPDX-License-Identifier: Apache-2.0
 
-import unicodedata
-from persistent_message.models import Message, TagGroup, Tag
+from persistent_message.models import Message
+from persistent_message.bulk import (
+    parse_messages, import_messages, export_messages, iter_ndjson,
+    iter_json_array)
+from persistent_message.serializers import (
+    deserialize_message, serialize_messages, serialize_tag_groups, dumps,
+    MESSAGE_FIELDS, MESSAGE_VALUES)
+from persistent_message.cache import (
+    active_message_cache, get_cache, get_tag_version, has_pending)
 from persistent_message.decorators import message_admin_required
+from persistent_message.metrics import instrument, response_size
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import (
+    HttpResponse, HttpResponseNotModified, StreamingHttpResponse)
 from django.views import View
+from django.utils import timezone, translation
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag
+from asgiref.sync import sync_to_async
 from logging import getLogger
 import dateutil.parser
+import asyncio
+import time
+import hashlib
+import base64
 import json
 
 logger = getLogger(__name__)
 
+MAX_PAGE_SIZE = 500
+
+
+class APIView(View):
+    def error_response(self, status, message='', content={}):
+        content['error'] = '{}'.format(message)
+        return HttpResponse(json.dumps(content),
+                            status=status,
+                            content_type='application/json')
+
+    def json_response(self, content='', status=200):
+        return HttpResponse(dumps(content),
+                            status=status,
+                            content_type='application/json')
+
 
 @method_decorator(message_admin_required, name='dispatch')
-class MessageAPI(View):
+class MessageAPI(APIView):
+    @instrument('message_api.get', size=response_size)
     def get(self, request, *args, **kwargs):
         try:
             message_id = kwargs['message_id']
@@ -27,12 +63,12 @@ class MessageAPI(View):
                 return self.error_response(
                     404, 'Message {} not found'.format(message_id))
         except KeyError:
-            messages = []
-            for message in sorted(Message.objects.all(), key=lambda m: (
-                    m.is_active(), m.modified), reverse=True):
-                messages.append(message.to_json())
-            return self.json_response({'messages': messages})
+            try:
+                return self.json_response(self._list(request))
+            except ValidationError as ex:
+                return self.error_response(400, ex.message)
 
+    @instrument('message_api.put', size=response_size)
     def put(self, request, *args, **kwargs):
         try:
             message_id = kwargs['message_id']
@@ -47,14 +83,15 @@ class MessageAPI(View):
             self._deserialize(request)
             self.message.save()
             if self.tags is not None:
-                self.message.tags.clear()
-                self.message.tags.add(*self.tags)
+                # Only the changed tags are added or removed
+                self.message.tags.set(self.tags)
         except ValidationError as ex:
             return self.error_response(400, ex)
 
         logger.info('Message ({}) updated'.format(self.message.pk))
         return self.json_response({'message': self.message.to_json()})
 
+    @instrument('message_api.post', size=response_size)
     def post(self, request, *args, **kwargs):
         self.message = Message()
 
@@ -69,6 +106,7 @@ class MessageAPI(View):
         logger.info('Message ({}) created'.format(self.message.pk))
         return self.json_response({'message': self.message.to_json()})
 
+    @instrument('message_api.delete', size=response_size)
     def delete(self, request, *args, **kwargs):
         try:
             message_id = kwargs['message_id']
@@ -84,57 +122,349 @@ class MessageAPI(View):
         logger.info('Message ({}) deleted'.format(message.pk))
         return self.json_response({})
 
-    def error_response(self, status, message='', content={}):
-        content['error'] = '{}'.format(message)
-        return HttpResponse(json.dumps(content),
-                            status=status,
-                            content_type='application/json')
+    def _list(self, request):
+        now = Message.current_datetime()
+        queryset = Message.objects.active_first(now)
 
-    def json_response(self, content='', status=200):
-        return HttpResponse(json.dumps(content),
-                            status=status,
-                            content_type='application/json')
+        level = request.GET.get('level')
+        if level:
+            try:
+                queryset = queryset.filter(level=int(level))
+            except ValueError:
+                raise ValidationError('Invalid level: {}'.format(level))
+
+        tags = request.GET.getlist('tag')
+        if len(tags):
+            message_tags = Message.tags.through.objects.filter(
+                tag__name__in=tags)
+            queryset = queryset.filter(
+                pk__in=message_tags.values('message_id'))
+
+        state = request.GET.get('state')
+        if state == 'active':
+            queryset = queryset.filter(active=True)
+        elif state == 'expired':
+            queryset = queryset.filter(expires__lte=now)
+        elif state == 'scheduled':
+            queryset = queryset.filter(begins__gt=now)
+        elif state:
+            raise ValidationError('Invalid state: {}'.format(state))
+
+        modified_since = request.GET.get('modified_since')
+        if modified_since:
+            queryset = queryset.filter(
+                modified__gte=self._parse_datetime(modified_since))
+
+        cursor = request.GET.get('cursor')
+        if cursor:
+            queryset = queryset.filter(self._cursor_filter(cursor))
+
+        queryset = queryset.values(*MESSAGE_VALUES, 'active')
+
+        limit = request.GET.get('limit')
+        if not limit:
+            return {'messages': list(serialize_messages(queryset, now)),
+                    'next_cursor': None}
+
+        try:
+            limit = int(limit)
+            if limit < 1 or limit > MAX_PAGE_SIZE:
+                raise ValueError()
+        except ValueError:
+            raise ValidationError('Invalid limit: {}'.format(limit))
+
+        rows = list(queryset[:limit + 1])
+        next_cursor = self._cursor(rows[limit - 1]) if (
+            len(rows) > limit) else None
+
+        return {'messages': list(serialize_messages(rows[:limit], now)),
+                'next_cursor': next_cursor}
+
+    def _cursor(self, row):
+        """
+        Encodes the (active, modified, id) sort key of the last message on a
+        page.
+        """
+        key = [row['active'], row['modified'].isoformat(), row['id']]
+        return base64.urlsafe_b64encode(
+            json.dumps(key).encode('utf-8')).decode('ascii')
+
+    def _cursor_filter(self, cursor):
+        try:
+            active, modified, pk = json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii')))
+            modified = dateutil.parser.isoparse(modified)
+            pk = int(pk)
+        except Exception:
+            raise ValidationError('Invalid cursor: {}'.format(cursor))
+
+        after = Q(active=active, modified__lt=modified) | Q(
+            active=active, modified=modified, pk__lt=pk)
+        if active:
+            after |= Q(active=False)
+        return after
+
+    def _parse_datetime(self, value):
+        try:
+            return dateutil.parser.isoparse(value)
+        except ValueError:
+            raise ValidationError('Invalid datetime: {}'.format(value))
 
     def _deserialize(self, request):
         self.tags = None
         try:
             json_data = json.loads(request.body)['message']
-            if not any(key in json_data for key in [
-                    'content', 'level', 'begins', 'expires', 'tags']):
+            if not any(key in json_data for key in MESSAGE_FIELDS):
                 raise ValidationError()
         except Exception as ex:
             raise ValidationError('Invalid JSON: {}'.format(request.body))
 
-        if 'content' in json_data:
-            self.message.content = unicodedata.normalize(
-                "NFKD", json_data['content']).strip()
-        if 'level' in json_data:
-            self.message.level = json_data['level']
-        if 'begins' in json_data:
-            begins = json_data['begins']
-            self.message.begins = dateutil.parser.parse(begins) if (
-                begins is not None) else None
-        if 'expires' in json_data:
-            expires = json_data['expires']
-            self.message.expires = dateutil.parser.parse(expires) if (
-                expires is not None) else None
-        if 'tags' in json_data:
-            self.tags = []
-            for name in json_data['tags']:
-                try:
-                    self.tags.append(Tag.objects.get(name=name))
-                except Tag.DoesNotExist:
-                    raise ValidationError('Invalid tag: {}'.format(name))
-
+        self.tags = deserialize_message(self.message, json_data)
         self.message.modified_by = request.user.username
 
 
+@method_decorator(message_admin_required, name='dispatch')
+class MessageImportAPI(APIView):
+    """
+    Creates messages from a JSON array, or from newline-delimited JSON
+    message objects. Nothing is created unless every message is valid.
+    """
+    def post(self, request, *args, **kwargs):
+        try:
+            items = parse_messages(request.body.decode('utf-8'))
+        except (ValidationError, UnicodeDecodeError) as ex:
+            return self.error_response(400, getattr(ex, 'message', ex))
+
+        messages, errors = import_messages(
+            items, modified_by=request.user.username)
+        if len(errors):
+            return self.json_response({'errors': errors}, status=400)
+
+        logger.info('{} messages imported'.format(len(messages)))
+        messages = Message.objects.filter(pk__in=[
+            m.pk for m in messages]).order_by('pk').prefetch_related(
+                'tags__group')
+        return self.json_response({
+            'messages': [m.to_json() for m in messages]})
+
+
+@method_decorator(message_admin_required, name='dispatch')
+class MessageExportAPI(APIView):
+    """
+    Streams every message as newline-delimited JSON, or as a JSON array
+    with format=json.
+    """
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format == 'ndjson':
+            content = iter_ndjson(export_messages())
+            content_type = 'application/x-ndjson'
+        elif export_format == 'json':
+            content = iter_json_array(export_messages())
+            content_type = 'application/json'
+        else:
+            return self.error_response(
+                400, 'Invalid format: {}'.format(export_format))
+
+        return StreamingHttpResponse(content, content_type=content_type)
+
+
 @method_decorator(message_admin_required, name='dispatch')
 class TagGroupAPI(View):
+    """
+    The tag catalogue, built with a single query and cached until a tag or
+    tag group changes. Responses are validated with an ETag derived from
+    the catalogue version.
+    """
+    @instrument('tag_group_api.get', size=response_size)
     def get(self, request, *args, **kwargs):
-        groups = []
-        for group in TagGroup.objects.all():
-            groups.append(group.to_json())
+        # Uncommitted tag changes are served, but not cached
+        if has_pending('tags'):
+            response = HttpResponse(
+                dumps({'tag_groups': serialize_tag_groups()}),
+                content_type='application/json')
+            patch_cache_control(response, private=True, no_store=True)
+            return response
 
-        return HttpResponse(json.dumps({'tag_groups': groups}),
-                            content_type='application/json')
+        version = get_tag_version()
+        etag = quote_etag(version)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            cache = get_cache()
+            key = 'persistent_message.tag_groups.{}'.format(version)
+            content = cache.get(key)
+            if content is None:
+                content = dumps({'tag_groups': serialize_tag_groups()})
+                cache.set(key, content)
+            response = HttpResponse(content, content_type='application/json')
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class ActiveMessagePayloadMixin(object):
+    """
+    Builds the JSON payload of the active messages for the level and tag
+    parameters, memoized per active set. Rendered content depends on the
+    active language and time zone, so they are part of the memo key and
+    of the ETag.
+    """
+    def _filters(self, request):
+        level = request.GET.get('level')
+        try:
+            level = int(level) if level else None
+        except ValueError:
+            raise ValidationError('Invalid level: {}'.format(level))
+
+        return level, tuple(sorted(set(request.GET.getlist('tag'))))
+
+    def _payload_key(self, level, tags):
+        return (level, tags, translation.get_language(),
+                timezone.get_current_timezone_name())
+
+    def _get_payload(self, active_set, level, tags):
+        key = self._payload_key(level, tags)
+        payload = active_set.payloads.get(key)
+        if payload is None:
+            payload = self._payload(active_set, level, tags)
+            active_set.payloads.set(key, payload)
+        return payload
+
+    async def _aget_payload(self, active_set, level, tags):
+        payload = active_set.payloads.get(self._payload_key(level, tags))
+        if payload is None:
+            payload = await sync_to_async(self._get_payload)(
+                active_set, level, tags)
+        return payload
+
+    def _payload(self, active_set, level, tags):
+        level, tags, language, tz = self._payload_key(level, tags)
+        etag = quote_etag(hashlib.sha1('{}:{}:{}:{}:{}:{}'.format(
+            active_set.version,
+            active_set.begins.isoformat() if active_set.begins else '',
+            level, ','.join(tags), language, tz).encode('utf-8')).hexdigest())
+
+        messages = []
+        for message in active_set.filter(level=level, tags=tags):
+            messages.append({
+                'id': message.pk,
+                'content': message.render(),
+                'level': message.level,
+                'level_name': message.get_level_display(),
+                'begins': message.begins,
+                'expires': message.expires,
+                'tags': sorted(message.tag_names),
+            })
+
+        return etag, dumps({'messages': messages})
+
+
+class ActiveMessageAPI(ActiveMessagePayloadMixin, APIView):
+    """
+    Public, read-only list of the active messages, filtered by the level
+    and tag parameters. Responses are cacheable until the next begins or
+    expires boundary, and are validated with an ETag derived from the
+    message version.
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            level, tags = self._filters(request)
+        except ValidationError as ex:
+            return self.error_response(400, ex.message)
+
+        now = Message.current_datetime()
+        active_set = active_message_cache.active_set(now)
+        payload = self._get_payload(active_set, level, tags)
+        return self._response(request, payload, active_set, now)
+
+    def _response(self, request, payload, active_set, now):
+        etag, content = payload
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=self._max_age(active_set, now))
+        return response
+
+    def _max_age(self, active_set, now):
+        max_age = getattr(settings, 'PERSISTENT_MESSAGE_MAX_AGE', 60)
+        if active_set.expires is not None:
+            max_age = min(max_age, int(
+                (active_set.expires - now).total_seconds()))
+        return max(max_age, 0)
+
+
+class AsyncActiveMessageAPI(ActiveMessageAPI):
+    """
+    Async counterpart of ActiveMessageAPI for ASGI deployments. A cached
+    payload is served without leaving the event loop.
+    """
+    async def get(self, request, *args, **kwargs):
+        try:
+            level, tags = self._filters(request)
+        except ValidationError as ex:
+            return self.error_response(400, ex.message)
+
+        now = Message.current_datetime()
+        active_set = await active_message_cache.aactive_set(now)
+        payload = await self._aget_payload(active_set, level, tags)
+        return self._response(request, payload, active_set, now)
+
+
+class ActiveMessageStream(ActiveMessagePayloadMixin, APIView):
+    """
+    Public Server-Sent Events stream of the active messages, filtered by
+    the level and tag parameters. An event is sent when the filtered
+    messages change, either because a message changed or because a begins
+    or expires boundary passed. Streams end after a maximum lifetime, and
+    clients reconnect. Requires an ASGI server.
+    """
+    async def get(self, request, *args, **kwargs):
+        # A WSGI server would hold a worker for as long as the stream lasts
+        if not isinstance(request, ASGIRequest):
+            return self.error_response(
+                501, 'The message stream requires an ASGI server')
+
+        try:
+            level, tags = self._filters(request)
+        except ValidationError as ex:
+            return self.error_response(400, ex.message)
+
+        response = StreamingHttpResponse(
+            self._events(level, tags), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def _events(self, level, tags):
+        interval = getattr(settings, 'PERSISTENT_MESSAGE_STREAM_INTERVAL', 1)
+        keepalive = getattr(
+            settings, 'PERSISTENT_MESSAGE_STREAM_KEEPALIVE', 15)
+        lifetime = getattr(
+            settings, 'PERSISTENT_MESSAGE_STREAM_LIFETIME', 300)
+        last_etag = None
+        last_sent = started = time.monotonic()
+
+        while time.monotonic() - started < lifetime:
+            now = Message.current_datetime()
+            active_set = await active_message_cache.aactive_set(now)
+            etag, content = await self._aget_payload(active_set, level, tags)
+
+            if etag != last_etag:
+                yield b'id: ' + etag.encode('utf-8') + (
+                    b'\nevent: messages\ndata: ' + content + b'\n\n')
+                last_etag = etag
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= keepalive:
+                yield b': keepalive\n\n'
+                last_sent = time.monotonic()
+
+            wait = min(interval, lifetime - (time.monotonic() - started))
+            if active_set.expires is not None:
+                wait = min(wait, (active_set.expires - now).total_seconds())
+            await asyncio.sleep(max(wait, 0))
@@ -29,6 +29,9 @@ setup(
         'python-dateutil',
         'nh3',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+    },
     license='Apache License, Version 2.0',
     description=('Django-Persistent-Message'),
     long_description=README,